@@ -1,17 +1,57 @@
 # app.py ───────────── FastAPI Ana Uygulama
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from dotenv import load_dotenv
-from routers import predict, chat,ws_chat
-# ── Ortam değişkenleri
+# ── Ortam değişkenleri (router/servis modülleri import anında env okur)
 load_dotenv()
 
+from routers import predict, chat,ws_chat
+from services.ml.upload_intake import UploadSizeLimitMiddleware, upload_body_limits
+from services.predictService import start_background_model_load, model_status, shutdown_inference
+from services.chat.http_client import start_http_client, close_http_client
+from services.chat import turn_tasks
+from services.chat.memory_jobs import memory_jobs
+from services.auth.firebase_auth import start_cert_prefetch, stop_cert_prefetch
+from routers.ws_chat import manager as ws_manager
+from services.serialization import ORJSONResponse
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # ── Model arka planda yüklenir: /ping hemen cevap verir, /ready model hazır olunca 200
+    start_background_model_load()
+    # ── Groq çağrıları için tek, pool'lu HTTP client (TLS/keep-alive yeniden kullanılır)
+    await start_http_client()
+    # ── Running summary işleri: thread başına birleştirilmiş, eşzamanlılığı sınırlı kuyruk
+    memory_jobs.start()
+    # ── Firebase public key'leri arka planda çekilir: token doğrulama sertifika indirmesini beklemez
+    start_cert_prefetch()
+    # ── WS yayınları için pub/sub (çok node'da odalar node'lar arası dağıtılır)
+    await ws_manager.start()
+    yield
+    stop_cert_prefetch()
+    await ws_manager.stop()
+    # ── Arka plandaki mesaj kaydı / hafıza özeti işleri HTTP client kapanmadan bitsin
+    await turn_tasks.drain()
+    await memory_jobs.stop()
+    await close_http_client()
+    shutdown_inference()
+
+
 # ── FastAPI
 app = FastAPI(
     title="Plantly Server",
     description="Bitki hastalığı tespiti ve AI chat servisi",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    # ── JSON cevapları: çıktı aynı kalacaksa orjson, değilse stdlib (services/serialization)
+    default_response_class=ORJSONResponse,
 )
 
+# ── Upload gövde limiti: büyük istekler multipart parse edilmeden 413
+app.add_middleware(UploadSizeLimitMiddleware, limits=upload_body_limits())
+
 # ── Router'ları dahil et
 app.include_router(predict.router)
 app.include_router(chat.router)
@@ -22,4 +62,11 @@ def root():
 
 @app.get("/ping")
 def ping():
+    """Liveness: process ayakta mı"""
     return {"msg": "pong"}
+
+@app.get("/ready")
+def ready():
+    """Readiness: model yüklendi mi (CNN_ENABLED=0 ya da lazy modda her zaman hazır)"""
+    status = model_status()
+    return ORJSONResponse(status, status_code=200 if status["ready"] else 503)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Görüntü decode benchmark'ı: eski yol (tam decode + resize) vs yeni yol
+(JPEG draft + reducing_gap + doğrudan float32 buffer).
+
+Usage: python benchmarks/bench_decode.py [--repeat 10] [--sizes 4000x3000,3024x4032]
+"""
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services.ml.image_decode import decode_to_tensor  # noqa: E402
+
+IMG_SIZE = (256, 256)
+
+
+def legacy_decode(image_bytes: bytes) -> np.ndarray:
+    """Önceki predictService yolu"""
+    img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    img = img.convert("RGB").resize(IMG_SIZE)
+    return np.asarray(img, dtype=np.float32)[None, ...]
+
+
+def fast_decode(image_bytes: bytes) -> np.ndarray:
+    return decode_to_tensor(image_bytes, IMG_SIZE)
+
+
+def synthetic_photo(w: int, h: int) -> Image.Image:
+    """Yaprak fotoğrafına benzer: yumuşak gradyan + doku gürültüsü"""
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[0:h, 0:w].astype(np.float32)
+    g = 90 + 80 * np.sin(xx / w * 3.1) * np.cos(yy / h * 2.3)
+    arr = np.stack([g * 0.6, g + 40, g * 0.4], axis=-1)
+    arr += rng.normal(0, 12, size=arr.shape).astype(np.float32)
+    return Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8), "RGB")
+
+
+def encode(img: Image.Image, fmt: str) -> bytes:
+    buf = io.BytesIO()
+    if fmt == "JPEG":
+        img.save(buf, fmt, quality=90)
+    elif fmt == "WEBP":
+        img.save(buf, fmt, quality=85)
+    else:
+        img.save(buf, fmt, compress_level=1)
+    return buf.getvalue()
+
+
+def measure(fn, data: bytes, repeat: int) -> float:
+    """Ortalama ms"""
+    fn(data)  # ısınma
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn(data)
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=10)
+    ap.add_argument("--sizes", default="4000x3000,3024x4032")
+    ap.add_argument("--formats", default="JPEG,PNG,WEBP")
+    args = ap.parse_args()
+
+    print(f"{'input':<22}{'bytes':>10}{'legacy ms':>12}{'fast ms':>10}{'speedup':>9}{'mean |Δ|':>10}")
+    for size in args.sizes.split(","):
+        w, h = (int(v) for v in size.lower().split("x"))
+        img = synthetic_photo(w, h)
+        for fmt in args.formats.split(","):
+            data = encode(img, fmt.upper())
+            legacy_ms = measure(legacy_decode, data, args.repeat)
+            fast_ms = measure(fast_decode, data, args.repeat)
+            # Piksel başına ortalama fark (0-255): draft decode'un doğruluğa etkisi
+            diff = float(np.mean(np.abs(legacy_decode(data) - fast_decode(data))))
+            print(f"{fmt + ' ' + size:<22}{len(data):>10}{legacy_ms:>12.1f}{fast_ms:>10.1f}"
+                  f"{legacy_ms / fast_ms:>8.1f}x{diff:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
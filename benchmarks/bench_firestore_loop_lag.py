@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Firestore çağrılarının event loop gecikmesine etkisi: eski senkron Client
+(coroutine içinden doğrudan çağrı) vs firestore_service'in AsyncClient yolu.
+
+Eşzamanlı N "tur" her biri mesaj yazar + son mesajları okur; bu sırada bir
+probe task her 5ms'de uyanır ve gecikmesini (lag) ölçer. Senkron yolda her
+round-trip loop'u bloklar, lag round-trip süresi kadar büyür.
+
+Emülatör gerekir (gerçek projeye yazmaz):
+  gcloud emulators firestore start --host-port=127.0.0.1:8080
+  FIRESTORE_EMULATOR_HOST=127.0.0.1:8080 FIREBASE_PROJECT_ID=demo-plantly \\
+      python benchmarks/bench_firestore_loop_lag.py --turns 200 --concurrency 20
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+from google.cloud import firestore
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services.database import firestore_service as fs  # noqa: E402
+
+PROBE_INTERVAL_S = 0.005
+UID = "bench-user"
+
+
+class LagProbe:
+    """Loop'un planlanan uyanmadan ne kadar geç kaldığını örnekler"""
+
+    def __init__(self):
+        self.samples = []
+        self._task = None
+
+    async def _loop(self):
+        while True:
+            t0 = time.perf_counter()
+            await asyncio.sleep(PROBE_INTERVAL_S)
+            self.samples.append((time.perf_counter() - t0 - PROBE_INTERVAL_S) * 1000)
+
+    def __enter__(self):
+        self._task = asyncio.ensure_future(self._loop())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+    def summary(self) -> str:
+        lat = sorted(self.samples) or [0.0]
+        p = lambda q: lat[min(len(lat) - 1, int(q * (len(lat) - 1)))]  # noqa: E731
+        return f"lag p50={p(0.5):6.1f}ms  p99={p(0.99):6.1f}ms  max={lat[-1]:6.1f}ms"
+
+
+# ---- Eski yol: senkron client, coroutine içinden doğrudan ----
+def _sync_client() -> firestore.Client:
+    return firestore.Client(project=fs.get_project_id())
+
+
+async def sync_turn(client: firestore.Client, thread_id: str, i: int) -> None:
+    msgs = client.collection("users").document(UID).collection("threads").document(thread_id).collection("messages")
+    msgs.document().set({"role": "user", "content": f"mesaj {i}", "createdAt": firestore.SERVER_TIMESTAMP, "meta": {}})
+    list(msgs.order_by("createdAt", direction=firestore.Query.DESCENDING).limit(20).stream())
+
+
+# ---- Yeni yol: firestore_service (AsyncClient) ----
+async def async_turn(thread_id: str, i: int) -> None:
+    await fs.add_message(UID, thread_id, role="user", content=f"mesaj {i}")
+    await fs.fetch_recent_messages(UID, thread_id, limit_n=20)
+
+
+async def run(label: str, make_turn, turns: int, concurrency: int) -> None:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with sem:
+            await make_turn(f"bench-{i % concurrency}", i)
+
+    with LagProbe() as probe:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(turns)))
+        wall = time.perf_counter() - t0
+    print(f"{label:<6} turns={turns:<5} {probe.summary()}  throughput={turns / wall:7.1f} turn/s")
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=20)
+    args = ap.parse_args()
+
+    if not os.getenv("FIRESTORE_EMULATOR_HOST"):
+        sys.exit("FIRESTORE_EMULATOR_HOST set edilmeli (benchmark gerçek projeye yazmaz)")
+
+    client = _sync_client()
+    await run("sync", lambda t, i: sync_turn(client, t, i), args.turns, args.concurrency)
+    await run("async", async_turn, args.turns, args.concurrency)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Groq çağrı gecikmesi: her istekte yeni httpx.AsyncClient vs paylaşılan pool'lu client.
+
+Önce stub'ı başlatın (TLS ile handshake maliyeti de ölçülür):
+  python benchmarks/groq_stub.py --port 8765 --delay-ms 50 [--certfile cert.pem --keyfile key.pem]
+
+Usage:
+  python benchmarks/bench_groq_pool.py --url http://127.0.0.1:8765/openai/v1/chat/completions \\
+      --requests 200 --concurrency 8 [--insecure]
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services.chat import http_client  # noqa: E402
+
+PAYLOAD = {
+    "model": "stub",
+    "messages": [
+        {"role": "system", "content": "Sen bitki sağlığı ve bakımında uzman bir asistansın."},
+        {"role": "user", "content": "Domatesimin yapraklarında kahverengi lekeler var, ne yapmalıyım?"},
+    ],
+    "temperature": 0.4,
+}
+HEADERS = {"Authorization": "Bearer stub", "Content-Type": "application/json"}
+
+
+async def unpooled_call(url: str, verify: bool) -> float:
+    """Eski davranış: her çağrıda yeni client (yeni TCP/TLS)"""
+    t0 = time.perf_counter()
+    async with httpx.AsyncClient(timeout=40.0, verify=verify) as client:
+        resp = await client.post(url, headers=HEADERS, json=PAYLOAD)
+    resp.raise_for_status()
+    return (time.perf_counter() - t0) * 1000
+
+
+async def pooled_call(client: httpx.AsyncClient, url: str) -> float:
+    t0 = time.perf_counter()
+    resp = await client.post(url, headers=HEADERS, json=PAYLOAD)
+    resp.raise_for_status()
+    return (time.perf_counter() - t0) * 1000
+
+
+async def run(label: str, make_call, n: int, concurrency: int) -> None:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            return await make_call()
+
+    t0 = time.perf_counter()
+    lat = sorted(await asyncio.gather(*(one() for _ in range(n))))
+    wall = time.perf_counter() - t0
+    p = lambda q: lat[min(len(lat) - 1, int(q * (len(lat) - 1)))]  # noqa: E731
+    print(f"{label:<10} n={n:<5} p50={p(0.5):7.1f}ms  p99={p(0.99):7.1f}ms  "
+          f"mean={statistics.mean(lat):7.1f}ms  throughput={n / wall:7.1f} req/s")
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default="http://127.0.0.1:8765/openai/v1/chat/completions")
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--insecure", action="store_true", help="Self-signed stub sertifikası için")
+    args = ap.parse_args()
+    verify = not args.insecure
+
+    await run("unpooled", lambda: unpooled_call(args.url, verify), args.requests, args.concurrency)
+
+    client = http_client.build_client(verify=verify)
+    async with client:
+        await pooled_call(client, args.url)   # ısınma: bağlantıyı aç
+        await run("pooled", lambda: pooled_call(client, args.url), args.requests, args.concurrency)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+JSON serileştirme mikro benchmark'ı. HTTP gövdesi: Starlette'in stdlib
+render'ı vs services.serialization.dumps_bytes (orjson, çıktı aynıysa);
+çözme: json.loads vs serialization.loads. Her payload için byte eşitliği
+doğrulanır. Payload'lar WS frame'leri (bench_ws_encoding ile aynı) ve
+/predict cevabıdır (küçük olasılıklar → stdlib yolu).
+
+Usage: python benchmarks/bench_json.py [--repeat 50000]
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from bench_ws_encoding import ASSISTANT, DELTA, DIAGNOSIS  # noqa: E402
+from services.serialization import _orjson_safe, dumps_bytes, loads, orjson  # noqa: E402
+
+PREDICT = {
+    "class": "Tomato___Bacterial_spot",
+    "classTr": "Domates bakteriyel leke",
+    "confidence": 0.8731,
+    "probs": [0.8731, 0.0612, 0.0311, 0.0154, 0.0089, 0.0043, 0.0027, 0.0018, 0.0009, 0.0004,
+              0.0001, 3.2e-05, 1.1e-05, 4.0e-06, 2.0e-06],
+    "latency_ms": 231,
+}
+
+# Olasılıklar parite aralığında (ör. yuvarlanmış): orjson yolu
+PREDICT_ROUNDED = {**PREDICT, "probs": [p for p in PREDICT["probs"] if p >= 1e-4]}
+
+
+def starlette_render(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def measure(fn, repeat: int) -> float:
+    """Ortalama µs"""
+    fn()  # ısınma
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=50000)
+    args = ap.parse_args()
+
+    backend = "orjson" if orjson is not None else "stdlib (orjson kurulu değil)"
+    print(f"serialization backend: {backend}")
+    print(f"{'payload':<16}{'path':<8}{'stdlib dumps':>14}{'fast dumps':>12}{'speedup':>9}"
+          f"{'stdlib loads':>14}{'fast loads':>12}{'speedup':>9}")
+    for name, payload in (("assistant", ASSISTANT), ("diagnosis", DIAGNOSIS), ("delta", DELTA),
+                          ("predict", PREDICT), ("predict_rounded", PREDICT_ROUNDED)):
+        body = starlette_render(payload)
+        assert dumps_bytes(payload) == body, name
+        path = "orjson" if orjson is not None and _orjson_safe(payload) else "stdlib"
+        std_d = measure(lambda: starlette_render(payload), args.repeat)
+        fast_d = measure(lambda: dumps_bytes(payload), args.repeat)
+        std_l = measure(lambda: json.loads(body), args.repeat)
+        fast_l = measure(lambda: loads(body), args.repeat)
+        print(f"{name:<16}{path:<8}{std_d:>12.2f}µs{fast_d:>10.2f}µs{std_d / fast_d:>8.1f}x"
+              f"{std_l:>12.2f}µs{fast_l:>10.2f}µs{std_l / fast_l:>8.1f}x")
+
+if __name__ == "__main__":
+    main()
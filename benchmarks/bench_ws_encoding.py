@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+WS frame kodlaması benchmark'ı: json / json+deflate / msgpack / msgpack+deflate
+için frame başına wire byte'ı ile kodlama (sunucu) ve çözme (istemci) CPU süresi.
+
+Payload'lar gerçek sohbet frame'lerine benzer: notlu asistan mesajı, teşhis
+systemEvent'i, stream delta'sı. msgpack kurulu değilse o satırlar atlanır.
+
+Usage: python benchmarks/bench_ws_encoding.py [--repeat 20000]
+"""
+import argparse
+import sys
+import time
+import zlib
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services.connection.codec import encode, msgpack  # noqa: E402
+from services.serialization import dumps, loads  # noqa: E402
+
+ASSISTANT = {
+    "type": "message",
+    "thread_id": "Vx8rQ2kLm0pZ4tYb7NcA",
+    "message": {
+        "role": "assistant",
+        "id": "k3J9sQ1wE5rT7yU2iO4p",
+        "content": (
+            "Teşhis: Domates bakteriyel leke. Yapraklardaki küçük, koyu kahverengi ve "
+            "sarı halkalı lekeler bakteriyel enfeksiyona işaret ediyor. Hastalık nemli ve "
+            "sıcak havada hızla yayılır; erken müdahale ile bitkinin büyük kısmını "
+            "kurtarabilirsiniz. Sulamayı yapraklara değil toprağa yapın ve sabah saatlerini tercih edin."
+        ),
+        "diagnosisTr": "Domates bakteriyel leke",
+        "classTr": "Domates bakteriyel leke",
+        "class": "Tomato___Bacterial_spot",
+        "confidence": 0.8731,
+        "notes": [
+            "Hastalıklı yaprakları kesip imha edin, komposta atmayın.",
+            "Bakır içerikli bir fungisiti etiketteki dozda 7-10 gün arayla uygulayın.",
+            "Bitkiler arasında hava sirkülasyonu için mesafe bırakın.",
+            "Aletlerinizi her kesimden sonra %70 alkolle dezenfekte edin.",
+        ],
+    },
+}
+
+DIAGNOSIS = {
+    "type": "message",
+    "thread_id": "Vx8rQ2kLm0pZ4tYb7NcA",
+    "message": {
+        "role": "systemEvent",
+        "id": "a8S7d6F5g4H3j2K1l0Qw",
+        "content": {
+            "type": "diagnosis",
+            "class": "Tomato___Bacterial_spot",
+            "classTr": "Domates bakteriyel leke",
+            "confidence": 0.8731,
+            "imageRef": None,
+        },
+    },
+}
+
+DELTA = {"type": "delta", "thread_id": "Vx8rQ2kLm0pZ4tYb7NcA", "id": "k3J9sQ1wE5rT7yU2iO4p", "delta": " yaprakları"}
+
+VARIANTS = [("json", False), ("json", True), ("msgpack", False), ("msgpack", True)]
+
+
+def decode(data, variant):
+    """Mobil istemcinin yaptığı çözme (binary: önce inflate, sonra json/msgpack)"""
+    if isinstance(data, str):
+        return loads(data)
+    if variant[1]:
+        data = zlib.decompress(data, -15)
+    return msgpack.unpackb(data, raw=False) if variant[0] == "msgpack" else loads(data)
+
+
+def measure(fn, repeat: int) -> float:
+    """Ortalama µs"""
+    fn()  # ısınma
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=20000)
+    args = ap.parse_args()
+
+    print(f"{'payload':<12}{'variant':<18}{'bytes':>8}{'vs json':>9}{'enc µs':>9}{'dec µs':>9}")
+    for name, payload in (("assistant", ASSISTANT), ("diagnosis", DIAGNOSIS), ("delta", DELTA)):
+        base = len(dumps(payload).encode("utf-8"))
+        for variant in VARIANTS:
+            if variant[0] == "msgpack" and msgpack is None:
+                continue
+            data = encode(payload, variant)
+            assert decode(data, variant) == payload
+            size = len(data) if isinstance(data, bytes) else len(data.encode("utf-8"))
+            enc_us = measure(lambda: encode(payload, variant), args.repeat)
+            dec_us = measure(lambda: decode(data, variant), args.repeat)
+            label = variant[0] + ("+deflate" if variant[1] else "")
+            print(f"{name:<12}{label:<18}{size:>8}{size / base:>8.0%} {enc_us:>8.1f}{dec_us:>9.1f}")
+    if msgpack is None:
+        print("(msgpack kurulu değil: pip install msgpack)")
+
+
+if __name__ == "__main__":
+    main()
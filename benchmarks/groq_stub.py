@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Yerel Groq (OpenAI uyumlu) stub sunucusu: testler ve benchmark'lar için.
+
+POST /openai/v1/chat/completions → sabit bir structured JSON cevap döner,
+`--delay-ms` kadar bekleyerek LLM gecikmesini taklit eder. `"stream": true`
+isteklerinde cevap SSE `delta` parçaları halinde, parça başına
+`--token-delay-ms` aralıkla akar.
+
+Usage:
+  python benchmarks/groq_stub.py --port 8765 --delay-ms 50
+  python benchmarks/groq_stub.py --port 8765 --certfile cert.pem --keyfile key.pem   # TLS
+
+Sunucuyu stub'a yönlendirmek için:
+  GROQ_API_URL=http://127.0.0.1:8765/openai/v1/chat/completions GROQ_API_KEY=stub uvicorn app:app
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+STUB_REPLY = {
+    "diagnosisTr": "Domates - Geç yanıklık",
+    "content": "Yapraklardaki lekeler geç yanıklık belirtisine benziyor. Hasta yaprakları uzaklaştırıp sulamayı toprağa yapın.",
+    "notes": [
+        "Lekeli yaprakları steril makasla kes.",
+        "Üstten sulamadan kaçın.",
+        "Bitkiler arasında hava sirkülasyonunu artır.",
+    ],
+}
+
+app = FastAPI(title="Groq stub")
+app.state.delay_s = 0.05
+app.state.token_delay_s = 0.01
+
+
+def completion(content: str, model: str) -> dict:
+    return {
+        "id": f"stub-{time.time_ns()}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    await asyncio.sleep(app.state.delay_s)
+    content = json.dumps(STUB_REPLY, ensure_ascii=False)
+    if body.get("stream"):
+        return StreamingResponse(stream_chunks(content, body.get("model", "stub")), media_type="text/event-stream")
+    return completion(content, body.get("model", "stub"))
+
+
+async def stream_chunks(content: str, model: str):
+    """OpenAI SSE formatı: data: {choices:[{delta:{content}}]} ... data: [DONE]"""
+    for i in range(0, len(content), 4):   # ~token boyutunda parçalar
+        chunk = {
+            "id": "stub-stream",
+            "object": "chat.completion.chunk",
+            "model": model,
+            "choices": [{"index": 0, "delta": {"content": content[i:i + 4]}, "finish_reason": None}],
+        }
+        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+        await asyncio.sleep(app.state.token_delay_s)
+    yield "data: [DONE]\n\n"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--delay-ms", type=float, default=50)
+    ap.add_argument("--token-delay-ms", type=float, default=10)
+    ap.add_argument("--certfile")
+    ap.add_argument("--keyfile")
+    args = ap.parse_args()
+
+    app.state.delay_s = args.delay_ms / 1000
+    app.state.token_delay_s = args.token_delay_ms / 1000
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning",
+                ssl_certfile=args.certfile, ssl_keyfile=args.keyfile)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,16 @@
 # routers/chat.py - Chat endpoint'leri
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-import httpx
-import json
 import os
 
+from services.chat.http_client import get_http_client
+from services.serialization import ORJSONResponse, JSONDecodeError, loads
+
 router = APIRouter(tags=["chat"])
 
 # Groq Chat
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+GROQ_API_URL = os.getenv("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
 
 class ChatRequest(BaseModel):
     prompt: str
@@ -64,15 +64,14 @@ async def groq_chat_endpoint(req: ChatRequest):
             }
 
         print("Groq API'ye istek gönderiliyor...")
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            resp = await client.post(GROQ_API_URL, headers=headers, json=payload)
+        resp = await get_http_client().post(GROQ_API_URL, headers=headers, json=payload)
         
         print(f"Groq API response status: {resp.status_code}")
         if resp.status_code != 200:
             print(f"Groq API error response: {resp.text}")
             raise HTTPException(resp.status_code, f"Groq API hatası: {resp.text}")
 
-        response_json = resp.json()
+        response_json = loads(resp.content)
         print(f"Groq API response: {response_json}")
         
         if "choices" not in response_json or len(response_json["choices"]) == 0:
@@ -83,13 +82,13 @@ async def groq_chat_endpoint(req: ChatRequest):
         
         # Groq'dan gelen JSON string'i doğrula
         try:
-            json.loads(groq_response_content)  # Validation için
-        except json.JSONDecodeError as je:
+            loads(groq_response_content)  # Validation için
+        except JSONDecodeError as je:
             print(f"JSON parse error: {je}")
             raise HTTPException(500, f"Groq'dan geçersiz JSON alındı: {je}")
         
         # Client'ın beklediği format: { "answer": "JSON string" }
-        return JSONResponse({
+        return ORJSONResponse({
             "answer": groq_response_content
         })
         
@@ -1,9 +1,17 @@
 # routers/predict.py - Predict endpoint'leri
+from typing import List
 from fastapi import APIRouter, UploadFile, File, HTTPException
+# probs küçük olasılıklar içerir (orjson float biçimi farklı): stdlib JSONResponse, çıktı aynı kalır
 from fastapi.responses import JSONResponse
 import time
-from services.predictService import run_cnn_prediction
+from services.predictService import (
+    run_cnn_prediction_async, run_cnn_prediction_batch_async, aggregate_predictions,
+    inference_stats, ModelUnavailableError
+)
 from services.ml.class_translations import to_tr_label
+from services.ml.executor import InferenceBusyError
+from services.ml.image_decode import ImageTooLargeError
+from services.ml.upload_intake import read_image_upload, PREDICT_BATCH_MAX_FILES
 
 router = APIRouter(tags=["predict"])
 
@@ -12,14 +20,10 @@ async def predict_endpoint(file: UploadFile = File(...)):
     """Bitki hastalığı tahmin endpoint'i"""
     t0 = time.time()
     try:
-        # Resim dosyasını oku ve işle
-        if hasattr(file, 'read'):
-            image_data = await file.read()
-        else:
-            # Alternatif okuma yöntemi
-            image_data = await file.file.read()
+        # Resim dosyasını parça parça oku (format/boyut kontrolü başta yapılır)
+        image_data = await read_image_upload(file)
 
-        cls, conf, probs = run_cnn_prediction(image_data)
+        cls, conf, probs = await run_cnn_prediction_async(image_data)
         cls_tr = to_tr_label(cls)
         
         return JSONResponse({
@@ -29,5 +33,69 @@ async def predict_endpoint(file: UploadFile = File(...)):
             "probs": probs,
             "latency_ms": int((time.time()-t0)*1000)
         })
+    except HTTPException:
+        raise
+    except InferenceBusyError as e:
+        raise HTTPException(503, "Sunucu meşgul, lütfen tekrar deneyin", headers={"Retry-After": str(e.retry_after)})
+    except ImageTooLargeError as e:
+        raise HTTPException(413, str(e))
+    except ModelUnavailableError as e:
+        raise HTTPException(503, f"Model kullanılamıyor: {e}")
     except Exception as e:
         raise HTTPException(500, f"Predict hatası: {e}")
+
+
+@router.post("/predict/batch")
+async def predict_batch_endpoint(files: List[UploadFile] = File(...), top_k: int = 3):
+    """Aynı bitkinin birden çok yaprağı: tek batched forward pass + bitki seviyesinde karar"""
+    t0 = time.time()
+    if len(files) > PREDICT_BATCH_MAX_FILES:
+        raise HTTPException(400, f"En fazla {PREDICT_BATCH_MAX_FILES} dosya gönderilebilir")
+
+    # Dosya bazında okuma hataları (413/415) sadece o dosyayı etkiler
+    images, errors = [], {}
+    for i, f in enumerate(files):
+        try:
+            images.append(await read_image_upload(f))
+        except HTTPException as e:
+            images.append(b"")
+            errors[i] = {"error": e.detail, "status": e.status_code}
+
+    try:
+        results = await run_cnn_prediction_batch_async(images)
+    except InferenceBusyError as e:
+        raise HTTPException(503, "Sunucu meşgul, lütfen tekrar deneyin", headers={"Retry-After": str(e.retry_after)})
+    except ModelUnavailableError as e:
+        raise HTTPException(503, f"Model kullanılamıyor: {e}")
+    except Exception as e:
+        raise HTTPException(500, f"Predict hatası: {e}")
+
+    items = []
+    for i, (f, r) in enumerate(zip(files, results)):
+        item = {"index": i, "filename": f.filename}
+        if i in errors:
+            item.update(errors[i])
+        elif isinstance(r, BaseException):
+            item.update({"error": str(r), "status": 413 if isinstance(r, ImageTooLargeError) else 422})
+        else:
+            cls, conf, probs = r
+            item.update({"class": cls, "classTr": to_tr_label(cls), "confidence": conf, "probs": probs})
+        items.append(item)
+
+    plant = aggregate_predictions(results, top_k=top_k)
+    if plant:
+        plant["classTr"] = to_tr_label(plant["class"])
+        for entry in plant["top_k"]:
+            entry["classTr"] = to_tr_label(entry["class"])
+
+    return JSONResponse({
+        "results": items,
+        "plant": plant,
+        "latency_ms": int((time.time()-t0)*1000)
+    })
+
+
+@router.get("/predict/stats")
+def predict_stats():
+    """Inference metrikleri: batch boyutu histogramı, kuyruk bekleme yüzdelikleri"""
+    return inference_stats()
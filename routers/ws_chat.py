@@ -2,34 +2,46 @@
 # FastAPI WebSocket + Firestore sohbet (threads under users/{uid}/threads), plantId ZORUNLU DEĞİL
 
 import os
-import json
+import asyncio
 from typing import Optional
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, UploadFile, File, Form, Header
+from fastapi.responses import JSONResponse
 
 # Local imports
 from services.connection.websocket_manager import WebSocketManager
-from services.auth.firebase_auth import verify_id_token_or_raise
+from services.connection.codec import negotiate
+from services.serialization import loads
+from services.auth.firebase_auth import verify_id_token_async, auth_stats
 from services.database.firestore_service import (
-    ensure_thread, add_message, update_last_diagnosis, fetch_recent_messages,
-    update_thread_title, is_first_assistant_message
+    ensure_thread, add_message, update_last_diagnosis,
+    update_thread_title, is_first_assistant_message, new_message_id, update_plant_disease,
+    release_thread, unit_of_work
 )
+from services.database.thread_cache import thread_cache
+from services.database.unit_of_work import track_round_trips, round_trip_stats
+from services.chat.turn_tasks import spawn, stats as turn_task_stats
+from services.chat.memory_jobs import memory_jobs
 from services.chat.groq_service import (
-    build_llm_messages, call_groq_api, call_groq_api_structured, generate_fallback_reply, summarize_into_memory,
-    generate_conversation_title
+    build_llm_messages, call_groq_api, call_groq_api_structured, call_groq_api_structured_stream,
+    generate_fallback_reply, generate_conversation_title
 )
-from services.predictService import run_cnn_prediction
+from services.predictService import run_cnn_prediction_async, ModelUnavailableError
 from services.ml.class_translations import to_tr_label
+from services.ml.executor import InferenceBusyError
+from services.ml.image_decode import ImageTooLargeError
+from services.ml.upload_intake import read_image_upload
 
 # -------------------- .env & Configuration --------------------
 from dotenv import load_dotenv
 load_dotenv()
 
 ALWAYS_NEW_THREAD_ON_INIT = os.getenv("ALWAYS_NEW_THREAD_ON_INIT", "0") == "1"
-# === Context & Memory Ayarları ===
+# === Context Ayarları === (memory ayarları services/chat/groq_service + memory_jobs'ta)
 HISTORY_MAX_CHARS = int(os.getenv("HISTORY_MAX_CHARS", "8000"))   # LLM bağlam bütçesi ~8k karakter
-MEMORY_ENABLED = os.getenv("MEMORY_ENABLED", "1") == "1"
-MEMORY_REFRESH_EVERY = int(os.getenv("MEMORY_REFRESH_EVERY", "3"))  # her 3 mesajda bir running summary güncelle
-MEM_FACTS_LIMIT = int(os.getenv("MEM_FACTS_LIMIT", "8"))            # sabit gerçek sayısı
+# init mesajında "stream" gönderilmezse kullanılacak varsayılan
+WS_STREAM_DEFAULT = os.getenv("WS_STREAM_DEFAULT", "0") == "1"
+# init mesajında "heartbeat" gönderilmezse: sunucu ping'i + idle kapatma (pong bilmeyen eski istemciler için kapalı)
+WS_HEARTBEAT_DEFAULT = os.getenv("WS_HEARTBEAT_DEFAULT", "0") == "1"
 
 router = APIRouter()
 
@@ -37,6 +49,25 @@ router = APIRouter()
 manager = WebSocketManager()
 
 
+# -------------------- Turn Background Jobs --------------------
+async def _generate_and_push_title(uid: str, thread_id: str, text: str) -> str:
+    """Başlığı üret, kaydet ve odaya title_updated olarak bildir"""
+    title = await generate_conversation_title(text)
+    await update_thread_title(uid, thread_id, title)
+    await manager.broadcast(thread_id, {
+        "type": "title_updated",
+        "thread_id": thread_id,
+        "title": title,
+    })
+    return title
+
+
+async def _persist_reply(uid: str, thread_id: str, message_id: str, assistant_response: dict) -> None:
+    """Asistan mesajını kaydet; running summary kuyruğuna bildir (user + assistant)"""
+    await add_message(uid, thread_id, role="assistant", content=assistant_response, message_id=message_id)
+    memory_jobs.note_messages(uid, thread_id, 2)
+
+
 # -------------------- WebSocket Endpoint --------------------
 @router.websocket("/ws/chat")
 async def chat_ws(websocket: WebSocket):
@@ -45,9 +76,16 @@ async def chat_ws(websocket: WebSocket):
     {
       "type": "init",
       "idToken": "<firebase id token>",
-      "thread_id": "opsiyonel"
+      "thread_id": "opsiyonel",
+      "stream": true                  # opsiyonel: asistan cevabı "delta" frame'leriyle akıtılır
     }
 
+    Streaming modda user_text cevabı önce {"type":"delta","thread_id","id","delta"}
+    frame'leri, akış bitince her zamanki tam {"type":"message"} frame'i olarak gelir.
+
+    İlk asistan cevabında başlık paralel üretilir; hazır olunca
+    {"type":"title_updated","thread_id","title"} frame'i gelir.
+
     Sonraki mesaj tipleri:
     - {"type":"user_text", "text":"Toprak değişmeli mi?"}
     - {"type":"diagnosis", "class":"Tomato__Late_Blight", "confidence":0.82, "image_ref":"...", "auto_reply": true}
@@ -57,13 +95,18 @@ async def chat_ws(websocket: WebSocket):
 
     uid = None
     thread_id = None
+    pending_persist: Optional[asyncio.Task] = None
 
     try:
         init_msg = await websocket.receive_text()
-        init = json.loads(init_msg)
+        init = loads(init_msg)
         new_thread_flag = bool(init.get("new_thread")) or ALWAYS_NEW_THREAD_ON_INIT
         title = init.get("title")
         initial_meta = {"title": title} if title else None
+        stream_mode = bool(init.get("stream", WS_STREAM_DEFAULT))
+        # Giden frame protokolü: varsayılan düz JSON text; msgpack ve/veya deflate binary
+        variant = negotiate(init.get("encoding"), init.get("compress"))
+        heartbeat = bool(init.get("heartbeat", WS_HEARTBEAT_DEFAULT))
 
         if init.get("type") != "init":
             await websocket.close(code=1002)
@@ -73,26 +116,34 @@ async def chat_ws(websocket: WebSocket):
         if not id_token:
             await websocket.close(code=4401)
             return
-        uid = verify_id_token_or_raise(id_token)
+        uid = await verify_id_token_async(id_token)
 
         # Thread'i users/{uid}/threads altında oluştur/garantile
-        thread_id = ensure_thread(
+        thread_id = await ensure_thread(
             uid,
             init.get("thread_id"),
             new_thread=new_thread_flag,
-            initial_meta=initial_meta
+            initial_meta=initial_meta,
+            acquire=True,               # oturum boyunca thread dokümanı cache'ten okunur
         )
 
         # Odaya ekle ve hazır bilgisi
-        await manager.connect(thread_id, websocket)
-        await websocket.send_text(json.dumps({
+        # Bundan sonra tüm gönderimler bağlantının kuyruğundan (tek yazıcı task) gider
+        await manager.connect(thread_id, websocket, uid=uid, variant=variant, heartbeat=heartbeat)
+        await manager.send(websocket, {
             "type": "thread_ready",
-            "thread_id": thread_id
-        }))
+            "thread_id": thread_id,
+            "encoding": variant[0],
+            "compress": "deflate" if variant[1] else None,
+            "heartbeat": heartbeat,
+        })
 
         while True:
+            # Heartbeat: receive beklerken idle sayılabilir, tur işlenirken sayılmaz
+            manager.touch(websocket, busy=False)
             raw = await websocket.receive_text()
-            data = json.loads(raw)
+            manager.touch(websocket, busy=True)
+            data = loads(raw)
             mtype = data.get("type")
 
             if mtype == "user_text":
@@ -100,27 +151,40 @@ async def chat_ws(websocket: WebSocket):
                 if not text:
                     continue
 
-                add_message(uid, thread_id, role="user", content=text)
-
-                # İlk assistant mesajı mı kontrol et
-                is_first = is_first_assistant_message(uid, thread_id)
+                # Önceki turun asistan mesajı kaydedilmeden geçmiş okunmasın
+                if pending_persist is not None and not pending_persist.done():
+                    await asyncio.wait({pending_persist})
 
-                messages = build_llm_messages(uid, thread_id, user_text=None)
-                assistant_response = await call_groq_api_structured(messages)
+                # Kullanıcı mesajı yazımı ve "ilk cevap mı" sorgusu paralel
+                _, is_first = await asyncio.gather(
+                    add_message(uid, thread_id, role="user", content=text),
+                    is_first_assistant_message(uid, thread_id),
+                )
 
-                # İlk mesajsa title üret
-                title = None
+                # İlk assistant mesajıysa başlık üretimi ana cevapla paralel başlar
+                title_task = None
                 if is_first:
-                    title = await generate_conversation_title(text)
-                    update_thread_title(uid, thread_id, title)
-
-                # Structured response'u database'e kaydet
-                asst_mid = add_message(uid, thread_id, role="assistant", content=assistant_response)
-                if MEMORY_ENABLED:
-                    recent = fetch_recent_messages(uid, thread_id, limit_n=20)
-                    if len(recent) % MEMORY_REFRESH_EVERY == 0:
-                         await summarize_into_memory(uid, thread_id, recent)
-                
+                    title_task = spawn(
+                        _generate_and_push_title(uid, thread_id, text),
+                        name=f"title:{thread_id}",
+                    )
+
+                messages = await build_llm_messages(uid, thread_id, user_text=None)
+                asst_mid = new_message_id(uid, thread_id)
+                if stream_mode:
+                    # Token'lar geldikçe odaya delta frame'i: kullanıcı ilk token'ı hemen görür
+                    async def _on_delta(text: str, _mid: str = asst_mid):
+                        await manager.broadcast(thread_id, {
+                            "type": "delta",
+                            "thread_id": thread_id,
+                            "id": _mid,
+                            "delta": text,
+                        })
+
+                    assistant_response = await call_groq_api_structured_stream(messages, _on_delta)
+                else:
+                    assistant_response = await call_groq_api_structured(messages)
+
                 # Response hazırla
                 message_data = {
                     "role": "assistant", 
@@ -139,21 +203,33 @@ async def chat_ws(websocket: WebSocket):
                     "message": message_data
                 }
                 
-                # İlk mesajsa title ekle
-                if title:
-                    response["title"] = title
+                # Başlık cevaptan önce hazırsa aynı frame'de de gönder (eski istemciler için)
+                if title_task is not None and title_task.done() and not title_task.cancelled() \
+                        and title_task.exception() is None:
+                    response["title"] = title_task.result()
                     
                 await manager.broadcast(thread_id, response)
 
+                # Kayıt + hafıza özeti cevap yayınlandıktan sonra arka planda
+                pending_persist = spawn(
+                    _persist_reply(uid, thread_id, asst_mid, assistant_response),
+                    name=f"persist:{thread_id}",
+                )
+
             elif mtype == "diagnosis":
+                if pending_persist is not None and not pending_persist.done():
+                    await asyncio.wait({pending_persist})
+
                 cls = data.get("class")
                 conf = float(data.get("confidence", 0))
                 image_ref = data.get("image_ref")
 
                 diag_payload = {"type": "diagnosis", "class": cls, "confidence": conf, "imageRef": image_ref}
-                diag_mid = add_message(uid, thread_id, role="systemEvent", content=diag_payload)
-
-                update_last_diagnosis(uid, thread_id, cls=cls, conf=conf, image_ref=image_ref)
+                # Mesaj + lastDiagnosis tek batch commit'i
+                async with unit_of_work() as uow:
+                    diag_mid = await add_message(uid, thread_id, role="systemEvent", content=diag_payload, uow=uow)
+                    await update_last_diagnosis(uid, thread_id, cls=cls, conf=conf, image_ref=image_ref, uow=uow)
+                memory_jobs.note_messages(uid, thread_id)
 
                 await manager.broadcast(thread_id, {
                     "type": "message",
@@ -162,9 +238,10 @@ async def chat_ws(websocket: WebSocket):
                 })
 
                 if data.get("auto_reply"):
-                    messages = build_llm_messages(uid, thread_id, user_text=None)
+                    messages = await build_llm_messages(uid, thread_id, user_text=None)
                     assistant_text = await call_groq_api(messages)
-                    asst_mid = add_message(uid, thread_id, role="assistant", content=assistant_text)
+                    asst_mid = await add_message(uid, thread_id, role="assistant", content=assistant_text)
+                    memory_jobs.note_messages(uid, thread_id)
                     await manager.broadcast(thread_id, {
                         "type": "message",
                         "thread_id": thread_id,
@@ -172,28 +249,54 @@ async def chat_ws(websocket: WebSocket):
                     })
 
             elif mtype == "ping":
-                await websocket.send_text(json.dumps({"type": "pong"}))
+                await manager.send(websocket, {"type": "pong"})
+
+            elif mtype == "pong":
+                # Sunucu ping'ine cevap; last_seen yukarıda güncellendi
+                continue
 
             else:
-                await websocket.send_text(json.dumps({"type": "error", "error": "Unknown message type"}))
+                await manager.send(websocket, {"type": "error", "error": "Unknown message type"})
 
     except WebSocketDisconnect:
         pass
     except Exception as e:
         try:
-            await websocket.send_text(json.dumps({"type": "error", "error": str(e)}))
+            await manager.send(websocket, {"type": "error", "error": str(e)})
         except Exception:
             pass
     finally:
         if thread_id:
+            await manager.drain(websocket)
             manager.disconnect(thread_id, websocket)
+            release_thread(uid, thread_id)
         try:
             await websocket.close()
         except Exception:
             pass
 
 
-@router.post("/chat/analyze-image")
+@router.get("/chat/stats")
+def chat_stats():
+    """Sohbet metrikleri: memory özet kuyruğu, tur görevleri, thread cache, auth cache"""
+    return {
+        "memory_jobs": memory_jobs.stats(),
+        "turn_tasks": turn_task_stats(),
+        "thread_cache": thread_cache.stats(),
+        "firestore_round_trips": round_trip_stats(),
+        "auth": auth_stats(),
+        "ws": manager.stats(),
+    }
+
+
+@router.get("/chat/connections")
+def chat_connections():
+    """Bu node'daki WS bağlantı/thread/kullanıcı sayıları (O(1), sık sorgulanabilir)"""
+    return manager.counts()
+
+
+# diagnosis.probs küçük olasılıklar içerir: stdlib render (bkz. services/serialization)
+@router.post("/chat/analyze-image", response_class=JSONResponse)
 async def analyze_image(
     id_token: str = Header(..., alias="idToken"),  # Firebase ID token (header)
     file: UploadFile = File(...),
@@ -209,41 +312,60 @@ async def analyze_image(
     Header:
       - idToken: Firebase ID token
     """
-    # 1) Auth & thread
-    uid = verify_id_token_or_raise(id_token)
-    t_id = ensure_thread(uid, thread_id)
+    # İstek başına Firestore round-trip sayısı /chat/stats'ta raporlanır
+    label = "analyze_image.auto_reply" if auto_reply else "analyze_image"
+    with track_round_trips(label):
+        return await _analyze_image(id_token, file, thread_id, plant_id, auto_reply)
 
-    # 2) Dosyayı oku
-    image_bytes = await file.read()
-    if not image_bytes:
-        raise HTTPException(status_code=400, detail="Boş dosya")
 
-    # 3) CNN tahmini (aynı process)
+async def _analyze_image(id_token: str, file: UploadFile, thread_id: Optional[str],
+                         plant_id: Optional[str], auto_reply: Optional[bool]) -> dict:
+    # 1) Auth
+    uid = await verify_id_token_async(id_token)
+
+    # 2) Dosyayı parça parça oku: hatalı/büyük dosya Firestore'a dokunmadan reddedilir (400/413/415)
+    image_bytes = await read_image_upload(file)
+
+    # 2.1) Thread
+    t_id = await ensure_thread(uid, thread_id)
+
+    # 3) CNN tahmini (inference executor + batcher, event loop dışında)
     try:
-        cls, conf, probs = run_cnn_prediction(image_bytes)
+        cls, conf, probs = await run_cnn_prediction_async(image_bytes)
+    except InferenceBusyError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Sunucu meşgul, lütfen tekrar deneyin",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ModelUnavailableError as e:
+        raise HTTPException(status_code=503, detail=f"Model kullanılamıyor: {e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Model inference hatası: {e}")
 
     cls_tr = to_tr_label(cls)
 
     # 4) Sohbete systemEvent olarak ekle + lastDiagnosis güncelle
+    # Tüm teşhis yazımları tek WriteBatch: tek round-trip, ya hepsi ya hiçbiri
     diag_payload = {"type": "diagnosis", "class": cls, "classTr": cls_tr, "confidence": conf, "imageRef": None}
-    mid = add_message(uid, t_id, role="systemEvent", content=diag_payload)
-    update_last_diagnosis(uid, t_id, cls=cls, conf=conf, image_ref=None)
-
-    # 4.1) (opsiyonel) plant_id geldiyse bitkinin hastalık alanını güncelle
-    if plant_id:
-        from services.database.firestore_service import update_plant_disease
-
-        update_plant_disease(
-            uid,
-            plant_id,
-            cls=cls,
-            cls_tr=cls_tr,
-            conf=conf,
-            thread_id=t_id,
-            image_ref=None,
-        )
+    async with unit_of_work() as uow:
+        mid = await add_message(uid, t_id, role="systemEvent", content=diag_payload, uow=uow)
+        await update_last_diagnosis(uid, t_id, cls=cls, conf=conf, image_ref=None, uow=uow)
+        # 4.1) (opsiyonel) plant_id geldiyse bitkinin hastalık alanını güncelle
+        if plant_id:
+            await update_plant_disease(
+                uid,
+                plant_id,
+                cls=cls,
+                cls_tr=cls_tr,
+                conf=conf,
+                thread_id=t_id,
+                image_ref=None,
+                uow=uow,
+            )
+    memory_jobs.note_messages(uid, t_id)
 
     # 5) WS yayını (açık oda varsa)
     await manager.broadcast(t_id, {
@@ -252,6 +374,14 @@ async def analyze_image(
         "message": {"role": "systemEvent", "content": diag_payload, "id": mid}
     })
 
+    # 5.1) Bitki güncellendiyse kullanıcının tüm socket'lerine (hangi thread açık olursa olsun)
+    if plant_id:
+        await manager.send_to_user(uid, {
+            "type": "plant_updated",
+            "plant_id": plant_id,
+            "lastDisease": {"class": cls, "classTr": cls_tr, "confidence": conf, "threadId": t_id},
+        })
+
     # 6) (opsiyonel) hemen LLM cevabı üret
     asst = None
     if auto_reply:
@@ -260,7 +390,7 @@ async def analyze_image(
             "Yeni teşhise göre kısa bir değerlendirme yap; 2–3 cümlede durumu özetle ve "
             "4 maddelik uygulanabilir bakım önerisi ver."
         )
-        messages = build_llm_messages(
+        messages = await build_llm_messages(
             uid, t_id, user_text=auto_user,
             plant_id=plant_id,
             append_user_text=True,
@@ -294,7 +424,8 @@ async def analyze_image(
             "notes": notes,
         }
 
-        asst_mid = add_message(uid, t_id, role="assistant", content=assistant_text, meta=asst_meta)
+        asst_mid = await add_message(uid, t_id, role="assistant", content=assistant_text, meta=asst_meta)
+        memory_jobs.note_messages(uid, t_id)
         await manager.broadcast(t_id, {
             "type": "message",
             "thread_id": t_id,
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Keras modelini TFLite artefaktlarına dönüştür ve Keras ile top-1 uyumunu ölç.
+
+Üretilenler (ml/models/):
+  mobilenetv2_final.tflite        float32
+  mobilenetv2_final_fp16.tflite   float16 ağırlıklar
+  mobilenetv2_final_int8.tflite   int8 (kalibrasyon görselleri gerekir)
+
+Usage:
+  python scripts/convert_tflite.py --calib-dir data/calib --parity-dir data/val
+  python scripts/convert_tflite.py --check-only --parity-dir data/val
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services.ml.backends import BACKEND_FILES, KerasBackend, TFLiteBackend  # noqa: E402
+from services.ml.image_decode import decode_to_tensor  # noqa: E402
+
+MODELS_DIR = Path(__file__).resolve().parents[1] / "ml" / "models"
+IMG_SIZE = (256, 256)
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+
+def iter_images(folder: Path, limit: int):
+    paths = sorted(p for p in folder.rglob("*") if p.suffix.lower() in IMAGE_EXTS)[:limit]
+    for p in paths:
+        yield p, decode_to_tensor(p.read_bytes(), IMG_SIZE)
+
+
+def convert(model, variant: str, calib_dir: Path | None, calib_limit: int) -> bytes:
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if variant == "tflite_fp16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif variant == "tflite_int8":
+        def representative_dataset():
+            for _, x in iter_images(calib_dir, calib_limit):
+                yield [x]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        # Ara katmanlar int8; giriş/çıkış float32 kalır (backend her ikisini de destekler)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    return converter.convert()
+
+
+def parity(keras_backend: KerasBackend, variants: list[str], parity_dir: Path, limit: int,
+           num_threads: int | None) -> dict:
+    """Her varyant için Keras ile top-1 uyum oranı ve maksimum olasılık farkı"""
+    samples = [x for _, x in iter_images(parity_dir, limit)]
+    if not samples:
+        raise SystemExit(f"Parity için görsel bulunamadı: {parity_dir}")
+
+    ref = np.concatenate([keras_backend.predict(x) for x in samples], axis=0)
+    results = {}
+    for variant in variants:
+        backend = TFLiteBackend(MODELS_DIR / BACKEND_FILES[variant], num_threads=num_threads, name=variant)
+        backend.load()
+        out = np.concatenate([backend.predict(x) for x in samples], axis=0)
+        results[variant] = {
+            "top1_agreement": float(np.mean(np.argmax(out, axis=1) == np.argmax(ref, axis=1))),
+            "max_abs_prob_diff": float(np.max(np.abs(out - ref))),
+            "n": len(samples),
+        }
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--variants", default="tflite,tflite_fp16,tflite_int8")
+    ap.add_argument("--calib-dir", type=Path, help="int8 kalibrasyonu için görsel klasörü")
+    ap.add_argument("--calib-limit", type=int, default=200)
+    ap.add_argument("--parity-dir", type=Path, help="Keras ile karşılaştırma için görsel klasörü")
+    ap.add_argument("--parity-limit", type=int, default=500)
+    ap.add_argument("--min-agreement", type=float, default=0.99)
+    ap.add_argument("--threads", type=int, default=None)
+    ap.add_argument("--check-only", action="store_true", help="Dönüştürme yapma, sadece parity ölç")
+    args = ap.parse_args()
+
+    variants = [v.strip() for v in args.variants.split(",") if v.strip()]
+    unknown = [v for v in variants if v not in BACKEND_FILES or v == "keras"]
+    if unknown:
+        raise SystemExit(f"Bilinmeyen varyant: {', '.join(unknown)}")
+
+    keras_backend = KerasBackend(MODELS_DIR / BACKEND_FILES["keras"])
+    keras_backend.load()
+
+    if not args.check_only:
+        for variant in variants:
+            if variant == "tflite_int8" and not args.calib_dir:
+                print("⚠️  tflite_int8 atlandı: --calib-dir verilmedi")
+                continue
+            out_path = MODELS_DIR / BACKEND_FILES[variant]
+            out_path.write_bytes(convert(keras_backend.model, variant, args.calib_dir, args.calib_limit))
+            print(f"✅ {variant}: {out_path} ({out_path.stat().st_size / 1e6:.1f} MB)")
+
+    if not args.parity_dir:
+        print("Parity kontrolü için --parity-dir verin.")
+        return
+
+    available = [v for v in variants if (MODELS_DIR / BACKEND_FILES[v]).exists()]
+    results = parity(keras_backend, available, args.parity_dir, args.parity_limit, args.threads)
+
+    failed = False
+    for variant, r in results.items():
+        ok = r["top1_agreement"] >= args.min_agreement
+        failed |= not ok
+        print(f"{'✅' if ok else '❌'} {variant}: top-1 uyum {r['top1_agreement']:.2%} "
+              f"(n={r['n']}), max |Δp| {r['max_abs_prob_diff']:.4f}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Bitki dokümanlarındaki eski `diseaseHistory` map'ini alt koleksiyona taşı.
+
+Eski:  users/{uid}/plants/{pid}.diseaseHistory = {"<ms>": entry, ...}
+Yeni:  users/{uid}/plants/{pid}/diseaseHistory/<ms> = entry
+
+Alt koleksiyon doküman id'si map key'i olduğundan script tekrar çalıştırılabilir
+(idempotent). Taşınan dokümanda map silinir ve `historyMigrated: true` yazılır;
+sunucu bu işaret olmayan dokümanlarda eski map'i okumaya devam eder.
+
+Usage:
+  python scripts/migrate_disease_history.py --dry-run
+  python scripts/migrate_disease_history.py [--uid <uid>] [--keep-map]
+  FIRESTORE_EMULATOR_HOST=127.0.0.1:8080 python scripts/migrate_disease_history.py
+"""
+import argparse
+import sys
+from pathlib import Path
+
+from google.cloud import firestore
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services.auth.firebase_auth import get_project_id  # noqa: E402
+
+BATCH_LIMIT = 450   # Firestore batch başına 500 yazım sınırının altında kal
+
+
+def iter_plants(client: firestore.Client, uid: str = None):
+    if uid:
+        yield from client.collection("users").document(uid).collection("plants").stream()
+    else:
+        yield from client.collection_group("plants").stream()
+
+
+def migrate_plant(client: firestore.Client, snap, *, dry_run: bool, keep_map: bool) -> int:
+    """Tek bitki dokümanı; taşınan kayıt sayısını döndürür"""
+    data = snap.to_dict() or {}
+    if data.get("historyMigrated"):
+        return 0
+    history = data.get("diseaseHistory")
+    entries = [(k, v) for k, v in history.items() if isinstance(v, dict)] if isinstance(history, dict) else []
+    if dry_run:
+        return len(entries)
+
+    # Map'i sil ve işaretle: son alt koleksiyon batch'iyle aynı commit'te, böylece
+    # son kayıtlar ile işaret birlikte görünür (map'i hiç olmayan dokümanlar da
+    # işaretlenir; sunucu eski map'i aramaz). Önceki batch'ler sürerken okuyan
+    # sunucu, alt koleksiyon ile map'teki aynı kayıtları tekilleştirir.
+    marker = {"historyMigrated": True}
+    if history is not None and not keep_map:
+        marker["diseaseHistory"] = firestore.DELETE_FIELD
+
+    col = snap.reference.collection("diseaseHistory")
+    chunks = [entries[i:i + BATCH_LIMIT] for i in range(0, len(entries), BATCH_LIMIT)] or [[]]
+    for i, chunk in enumerate(chunks):
+        batch = client.batch()
+        for key, entry in chunk:
+            batch.set(col.document(str(key)), entry)
+        if i == len(chunks) - 1:
+            batch.update(snap.reference, marker)
+        batch.commit()
+    return len(entries)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--uid", help="Sadece bu kullanıcının bitkileri")
+    ap.add_argument("--dry-run", action="store_true", help="Yazma, sadece say")
+    ap.add_argument("--keep-map", action="store_true", help="Eski map'i silme (sadece işaretle)")
+    args = ap.parse_args()
+
+    client = firestore.Client(project=get_project_id())
+    plants = moved = 0
+    for snap in iter_plants(client, args.uid):
+        n = migrate_plant(client, snap, dry_run=args.dry_run, keep_map=args.keep_map)
+        if n:
+            plants += 1
+            moved += n
+            print(f"{snap.reference.path}: {n} kayıt{' (dry-run)' if args.dry_run else ''}")
+    print(f"Toplam: {plants} bitki, {moved} geçmiş kaydı")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,13 @@
 # Firebase Authentication servisi
 
 import os
+import asyncio
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
 from fastapi import HTTPException
 import firebase_admin
 from firebase_admin import credentials, auth
@@ -37,13 +44,162 @@ if not firebase_admin._apps:
         firebase_admin.initialize_app(options={'projectId': PROJECT_ID})
 
 
+# === Token Cache Ayarları ===
+AUTH_TOKEN_CACHE_MAX = int(os.getenv("AUTH_TOKEN_CACHE_MAX", "10000"))
+AUTH_TOKEN_CACHE_SKEW_S = float(os.getenv("AUTH_TOKEN_CACHE_SKEW_S", "60"))     # exp'ten bu kadar önce düşür
+AUTH_CERTS_REFRESH_S = float(os.getenv("AUTH_CERTS_REFRESH_S", "3600"))         # Cache-Control yoksa yenileme aralığı
+ID_TOKEN_CERT_URI = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+
+
+class VerifiedTokenCache:
+    """
+    Doğrulanmış ID token'lar: sha256(token) → (uid, exp). Token'ın kendisi
+    tutulmaz. Entry exp - skew anında düşer; boyut LRU ile sınırlı.
+    """
+
+    def __init__(self, max_entries: int = AUTH_TOKEN_CACHE_MAX, skew_s: float = AUTH_TOKEN_CACHE_SKEW_S):
+        self.max_entries = max_entries
+        self.skew_s = skew_s
+        self._data: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(id_token: str) -> str:
+        return hashlib.sha256(id_token.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[1] - self.skew_s <= time.time():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key: str, uid: str, exp: float) -> None:
+        if exp - self.skew_s <= time.time() or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = (uid, exp)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else None,
+        }
+
+
+token_cache = VerifiedTokenCache()
+
+
 def verify_id_token_or_raise(id_token: str) -> str:
-    """Firebase ID token'ı doğrula ve UID döndür"""
+    """Firebase ID token'ı doğrula ve UID döndür (doğrulanmış token'lar exp'e kadar cache'te)"""
+    key = VerifiedTokenCache.key(id_token)
+    uid = token_cache.get(key)
+    if uid is not None:
+        return uid
+    return _verify_and_cache(key, id_token)
+
+
+def _verify_and_cache(key: str, id_token: str) -> str:
     try:
         decoded = auth.verify_id_token(id_token)
-        return decoded["uid"]
     except Exception as e:
         raise HTTPException(status_code=401, detail=f"Auth failed: {e}")
+    token_cache.put(key, decoded["uid"], float(decoded.get("exp", 0)))
+    return decoded["uid"]
+
+
+async def verify_id_token_async(id_token: str) -> str:
+    """Async çağrı noktaları için: cache hit döngüde, miss (RSA doğrulama, gerekirse
+    sertifika indirme) thread'de çalışır; event loop bloklanmaz."""
+    key = VerifiedTokenCache.key(id_token)
+    uid = token_cache.get(key)
+    if uid is not None:
+        return uid
+    return await asyncio.to_thread(_verify_and_cache, key, id_token)
+
+
+# -------------------- Public key prefetch --------------------
+_certs_stop = threading.Event()
+_certs_thread: Optional[threading.Thread] = None
+_certs_state = {"last_refresh": None, "last_error": None, "refreshes": 0}
+
+
+def _sdk_certs_request():
+    """
+    verify_id_token'ın kullandığı (HTTP cache'li) transport isteği. Sertifikaları
+    bununla çekmek SDK'nın cache'ini ısıtır; SDK iç yapısı değişirse None (SDK
+    sertifikaları yine ilk doğrulamada kendisi çeker). İstek no-cache ile gider:
+    yoksa taze cache kopyası cevap verir, ağa çıkılmaz ve cache süresi uzamaz.
+    """
+    try:
+        client = auth._get_client(firebase_admin.get_app())
+        return client._token_verifier.request
+    except Exception:
+        return None
+
+
+def _max_age(headers) -> Optional[float]:
+    m = re.search(r"max-age=(\d+)", (headers or {}).get("cache-control", "") or "")
+    return float(m.group(1)) if m else None
+
+
+def refresh_public_keys() -> Optional[float]:
+    """Sertifikaları çek; bir sonraki yenilemeye kadar saniye (bilinmiyorsa None)"""
+    request = _sdk_certs_request()
+    if request is None:
+        _certs_state["last_error"] = "SDK transport bulunamadı"
+        return None
+    resp = request(url=ID_TOKEN_CERT_URI, method="GET", headers={"Cache-Control": "no-cache"})
+    if resp.status != 200:
+        raise RuntimeError(f"cert fetch HTTP {resp.status}")
+    _certs_state["last_refresh"] = time.time()
+    _certs_state["last_error"] = None
+    _certs_state["refreshes"] += 1
+    return _max_age({k.lower(): v for k, v in resp.headers.items()})
+
+
+def _certs_loop() -> None:
+    while not _certs_stop.is_set():
+        try:
+            max_age = refresh_public_keys()
+            # Google sertifikaları saatler mertebesinde max-age ile yayınlar; süre dolmadan yenile
+            wait = max(60.0, 0.8 * max_age) if max_age else AUTH_CERTS_REFRESH_S
+        except Exception as e:
+            _certs_state["last_error"] = str(e)
+            print(f"Firebase public key ön-çekme başarısız: {e}")
+            wait = 60.0
+        _certs_stop.wait(wait)
+
+
+def start_cert_prefetch() -> None:
+    """FastAPI lifespan başında: sertifikaları hemen ve periyodik olarak arka planda çek"""
+    global _certs_thread
+    if _certs_thread is not None and _certs_thread.is_alive():
+        return
+    _certs_stop.clear()
+    _certs_thread = threading.Thread(target=_certs_loop, name="firebase-certs", daemon=True)
+    _certs_thread.start()
+
+
+def stop_cert_prefetch() -> None:
+    _certs_stop.set()
+
+
+def auth_stats() -> dict:
+    return {"token_cache": token_cache.stats(), "public_keys": dict(_certs_state)}
 
 
 def get_project_id() -> str:
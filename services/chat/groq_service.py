@@ -3,13 +3,16 @@
 
 import os
 import json
-from typing import List, Optional
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
 from datetime import datetime, timezone
 
-import httpx
 from dotenv import load_dotenv
 
 from services.ml.class_translations import to_tr_label
+from services.chat.http_client import get_http_client
+from services.chat.stream_parser import ContentFieldStreamer
+from services.serialization import JSONDecodeError, loads
 
 # .env'yi mümkün olduğunca erken yükle (env read'leri doğru olsun)
 load_dotenv()
@@ -21,14 +24,14 @@ MEMORY_REFRESH_EVERY = int(os.getenv("MEMORY_REFRESH_EVERY", "3"))  # her 3 mesa
 MEM_FACTS_LIMIT = int(os.getenv("MEM_FACTS_LIMIT", "8"))            # sabit gerçek sayısı
 
 from ..database.firestore_service import (
-    fetch_recent_messages, thread_ref,
-    get_thread_memory, save_thread_memory, trim_history_by_chars,
+    fetch_prompt_history, get_thread_doc,
+    get_thread_memory, save_thread_memory,
     get_plant_disease_context
 )
 
 # Groq Configuration
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+GROQ_API_URL = os.getenv("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
 GROQ_MODEL = os.getenv("GROQ_MODEL", "openai/gpt-oss-20b")
 
 SYSTEM_PROMPT = (
@@ -73,21 +76,21 @@ def is_smalltalk(text: Optional[str]) -> bool:
     return (len(t) <= 40) and any(w in t for w in SMALLTALK_WORDS)
 
 
-def build_llm_messages(uid: str, thread_id: str, user_text: Optional[str],
+async def build_llm_messages(uid: str, thread_id: str, user_text: Optional[str],
                        *, plant_id: Optional[str] = None,
                        append_user_text: bool = True,
                        force_include_diag: Optional[bool] = None,
                        history_k: int = 20) -> List[dict]:
 
-    t_snap = thread_ref(uid, thread_id).get()
-    t_data = t_snap.to_dict() or {}
+    # Thread dokümanı ve geçmiş birbirinden bağımsız: tek round-trip süresinde paralel oku
+    # (A) geçmiş bütçeye göre kırpılmış gelir (oturum penceresinde artımlı tutulur)
+    t_data, history = await asyncio.gather(
+        get_thread_doc(uid, thread_id),
+        fetch_prompt_history(uid, thread_id, limit_n=history_k, max_chars=HISTORY_MAX_CHARS),
+    )
     last_diag = t_data.get("lastDiagnosis")
     memory = (t_data.get("memory") or {}) if MEMORY_ENABLED else {}
 
-    history = fetch_recent_messages(uid, thread_id, limit_n=history_k)
-    # (A) bütçeye göre kırp
-    history = trim_history_by_chars(history, HISTORY_MAX_CHARS)
-
     messages = [{"role": "system", "content": SYSTEM_PROMPT}]
 
     # (B) hafıza (özet + sabit gerçekler) en başa
@@ -101,7 +104,7 @@ def build_llm_messages(uid: str, thread_id: str, user_text: Optional[str],
     # (B2) Bitki hastalık geçmişi (plant_id verilirse)
     if plant_id:
         try:
-            ctx = get_plant_disease_context(uid, plant_id, limit_n=5)
+            ctx = await get_plant_disease_context(uid, plant_id, limit_n=5)
             last = ctx.get("lastDisease")
             hist = ctx.get("history") or []
 
@@ -160,7 +163,7 @@ def build_llm_messages(uid: str, thread_id: str, user_text: Optional[str],
         c = m.get("content", "")
         if r == "systemEvent":
             try:
-                payload = c if isinstance(c, dict) else json.loads(c)
+                payload = c if isinstance(c, dict) else loads(c)
                 if payload.get("type") == "diagnosis" and include_diag:
                     cls = payload.get("class")
                     tr = to_tr_label(str(cls or ""))
@@ -170,6 +173,7 @@ def build_llm_messages(uid: str, thread_id: str, user_text: Optional[str],
                 pass
         elif r in ("user", "assistant"):
             if isinstance(c, dict):
+                # Prompt metni stdlib biçiminde kalır (karakter bütçesi firestore_service ile aynı)
                 c = json.dumps(c, ensure_ascii=False)
             messages.append({"role": r, "content": c})
 
@@ -187,24 +191,21 @@ async def call_groq_api(messages: List[dict]) -> str:
     headers = {"Authorization": f"Bearer {GROQ_API_KEY}", "Content-Type": "application/json"}
     payload = {"model": GROQ_MODEL, "messages": messages, "temperature": 0.4}
     
-    async with httpx.AsyncClient(timeout=40.0) as client:
-        resp = await client.post(GROQ_API_URL, headers=headers, json=payload)
+    resp = await get_http_client().post(GROQ_API_URL, headers=headers, json=payload)
     
     if resp.status_code != 200:
         raise RuntimeError(f"Groq API hatası: {resp.status_code} {resp.text}")
     
-    data = resp.json()
+    data = loads(resp.content)
     text = data.get("choices", [{}])[0].get("message", {}).get("content", "")
     return (text or "").strip()
 
 
-async def call_groq_api_structured(messages: List[dict]) -> dict:
-    """Groq API'ye çağrı yap ve JSON yanıt parse et"""
-    raw_response = await call_groq_api(messages)
-    
+def parse_structured_response(raw_response: str) -> dict:
+    """Model çıktısını {diagnosisTr, content, notes} yapısına çevir"""
     try:
         # JSON parse et
-        response_data = json.loads(raw_response)
+        response_data = loads(raw_response)
         
         # Doğrula
         if not isinstance(response_data, dict):
@@ -223,7 +224,7 @@ async def call_groq_api_structured(messages: List[dict]) -> dict:
             "notes": notes
         }
         
-    except (json.JSONDecodeError, ValueError, KeyError):
+    except (JSONDecodeError, ValueError, KeyError):
         # JSON parse edilemezse fallback
         return {
             "diagnosisTr": "",
@@ -232,6 +233,58 @@ async def call_groq_api_structured(messages: List[dict]) -> dict:
         }
 
 
+async def call_groq_api_structured(messages: List[dict]) -> dict:
+    """Groq API'ye çağrı yap ve JSON yanıt parse et"""
+    raw_response = await call_groq_api(messages)
+    return parse_structured_response(raw_response)
+
+
+async def stream_groq_api(messages: List[dict]) -> AsyncIterator[str]:
+    """Groq API'ye stream=true ile çağrı yap; gelen token parçalarını (SSE delta) yield et"""
+    if not GROQ_API_KEY:
+        raise RuntimeError("GROQ_API_KEY tanımlı değil.")
+
+    headers = {"Authorization": f"Bearer {GROQ_API_KEY}", "Content-Type": "application/json"}
+    payload = {"model": GROQ_MODEL, "messages": messages, "temperature": 0.4, "stream": True}
+
+    async with get_http_client().stream("POST", GROQ_API_URL, headers=headers, json=payload) as resp:
+        if resp.status_code != 200:
+            body = (await resp.aread()).decode("utf-8", "replace")
+            raise RuntimeError(f"Groq API hatası: {resp.status_code} {body}")
+
+        async for line in resp.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            try:
+                chunk = loads(data)
+            except JSONDecodeError:
+                continue
+            delta = ((chunk.get("choices") or [{}])[0].get("delta") or {}).get("content")
+            if delta:
+                yield delta
+
+
+async def call_groq_api_structured_stream(
+    messages: List[dict],
+    on_delta: Callable[[str], Awaitable[None]],
+) -> dict:
+    """
+    Streaming structured çağrı: content alanının metni geldikçe on_delta(text) çağrılır,
+    akış bitince tam cevap call_groq_api_structured ile aynı yapıda döner.
+    """
+    streamer = ContentFieldStreamer()
+    parts: List[str] = []
+    async for token in stream_groq_api(messages):
+        parts.append(token)
+        text = streamer.feed(token)
+        if text:
+            await on_delta(text)
+    return parse_structured_response("".join(parts).strip())
+
+
 async def generate_conversation_title(user_message: str) -> str:
     """İlk kullanıcı mesajına göre konuşma başlığı üret"""
     title_prompt = f"""Aşağıdaki kullanıcı mesajına göre kısa ve öz bir başlık oluştur. 
@@ -379,7 +432,7 @@ async def summarize_into_memory(uid: str, thread_id: str, recent: List[dict]):
     if not MEMORY_ENABLED:
         return
 
-    prev = get_thread_memory(uid, thread_id)
+    prev = await get_thread_memory(uid, thread_id)
     prev_summary = prev.get("summary", "")
     prev_facts = prev.get("facts", [])
 
@@ -404,7 +457,7 @@ async def summarize_into_memory(uid: str, thread_id: str, recent: List[dict]):
         if r == "systemEvent":
             try:
                 p = m["content"]
-                if isinstance(p, str): p = json.loads(p)
+                if isinstance(p, str): p = loads(p)
                 if p.get("type") == "diagnosis":
                     tr = to_tr_label(str(p.get("class") or ""))
                     c = f"[TEŞHİS] {tr} (%{round(float(p.get('confidence',0))*100)})"
@@ -416,11 +469,10 @@ async def summarize_into_memory(uid: str, thread_id: str, recent: List[dict]):
     try:
         headers = {"Authorization": f"Bearer {GROQ_API_KEY}", "Content-Type": "application/json"}
         payload = {"model": GROQ_MODEL, "messages": msgs, "temperature": 0.2}
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            resp = await client.post(GROQ_API_URL, headers=headers, json=payload)
-        data = resp.json()
+        resp = await get_http_client().post(GROQ_API_URL, headers=headers, json=payload)
+        data = loads(resp.content)
         out = (data.get("choices",[{}])[0].get("message",{}) or {}).get("content","").strip()
-        mem = json.loads(out)
+        mem = loads(out)
         # kısıtla ve birleştir
         facts = (mem.get("facts") or [])[:MEM_FACTS_LIMIT]
         summary = (mem.get("summary") or prev_summary).strip()
@@ -430,7 +482,7 @@ async def summarize_into_memory(uid: str, thread_id: str, recent: List[dict]):
             "updatedAt": datetime.now(timezone.utc),
             "msgCount": int(prev.get("msgCount",0)) + 1
         }
-        save_thread_memory(uid, thread_id, memory)
+        await save_thread_memory(uid, thread_id, memory)
     except Exception:
         # sessiz fallback: en azından sayaç güncellensin
         memory = {
@@ -439,4 +491,4 @@ async def summarize_into_memory(uid: str, thread_id: str, recent: List[dict]):
             "updatedAt": datetime.now(timezone.utc),
             "msgCount": int(prev.get("msgCount",0)) + 1
         }
-        save_thread_memory(uid, thread_id, memory)
+        await save_thread_memory(uid, thread_id, memory)
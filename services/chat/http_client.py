@@ -0,0 +1,66 @@
+# http_client.py
+# Groq çağrıları için paylaşılan, connection pool'lu httpx.AsyncClient
+
+import os
+from typing import Optional
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# === HTTP Pool Ayarları ===
+GROQ_HTTP2 = os.getenv("GROQ_HTTP2", "1") == "1"
+GROQ_MAX_CONNECTIONS = int(os.getenv("GROQ_MAX_CONNECTIONS", "20"))
+GROQ_MAX_KEEPALIVE = int(os.getenv("GROQ_MAX_KEEPALIVE", "10"))
+GROQ_KEEPALIVE_EXPIRY_S = float(os.getenv("GROQ_KEEPALIVE_EXPIRY_S", "30"))
+GROQ_CONNECT_TIMEOUT_S = float(os.getenv("GROQ_CONNECT_TIMEOUT_S", "5"))
+GROQ_TIMEOUT_S = float(os.getenv("GROQ_TIMEOUT_S", "40"))
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _http2_available() -> bool:
+    """HTTP/2 için `h2` paketi gerekir (httpx[http2])"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def build_client(*, verify: bool = True) -> httpx.AsyncClient:
+    """Pool/timeout ayarlarıyla yeni bir client (benchmark'lar da kullanır)"""
+    return httpx.AsyncClient(
+        verify=verify,
+        http2=GROQ_HTTP2 and _http2_available(),
+        limits=httpx.Limits(
+            max_connections=GROQ_MAX_CONNECTIONS,
+            max_keepalive_connections=GROQ_MAX_KEEPALIVE,
+            keepalive_expiry=GROQ_KEEPALIVE_EXPIRY_S,
+        ),
+        timeout=httpx.Timeout(GROQ_TIMEOUT_S, connect=GROQ_CONNECT_TIMEOUT_S),
+    )
+
+
+async def start_http_client() -> None:
+    """FastAPI lifespan başında çağrılır"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = build_client()
+
+
+async def close_http_client() -> None:
+    """FastAPI lifespan sonunda çağrılır: keep-alive bağlantılarını kapat"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Paylaşılan client; lifespan dışında (script/test) ilk kullanımda oluşturulur"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = build_client()
+    return _client
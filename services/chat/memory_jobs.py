@@ -0,0 +1,188 @@
+# memory_jobs.py
+# Running summary (memory) güncellemeleri için in-process iş kuyruğu: thread başına tek bekleyen iş
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+from services.chat.groq_service import MEMORY_ENABLED, MEMORY_REFRESH_EVERY, summarize_into_memory
+from services.database.firestore_service import fetch_recent_messages
+
+load_dotenv()
+
+# === Memory Kuyruk Ayarları ===
+MEMORY_JOB_CONCURRENCY = int(os.getenv("MEMORY_JOB_CONCURRENCY", "2"))     # aynı anda en fazla kaç özet LLM çağrısı
+MEMORY_JOB_DEBOUNCE_S = float(os.getenv("MEMORY_JOB_DEBOUNCE_S", "5"))     # son mesajdan sonra bekleme (seri mesajlar tek özette)
+MEMORY_JOB_MAX_PENDING = int(os.getenv("MEMORY_JOB_MAX_PENDING", "500"))   # üstünde yeni thread işi düşürülür
+MEMORY_JOB_MAX_TRACKED = int(os.getenv("MEMORY_JOB_MAX_TRACKED", str(4 * MEMORY_JOB_MAX_PENDING)))  # sayaç tutulan thread üst sınırı (LRU)
+MEMORY_RECENT_LIMIT = 20
+
+Key = Tuple[str, str]  # (uid, thread_id)
+
+
+class MemoryJobQueue:
+    """
+    - note_messages() her kaydedilen mesajda thread sayacını artırır; sayaç
+      MEMORY_REFRESH_EVERY'ye ulaşınca özet işi planlanır (fetch limitinden bağımsız).
+      Sayaçlar en fazla max_tracked thread için tutulur; en uzun süredir mesaj
+      almayan thread'in sayacı atılır (o thread eşiğe sıfırdan başlar).
+    - Thread başına tek bekleyen iş: tekrar gelen istekler birleştirilir (coalesce),
+      debounce süresi her yeni mesajla uzar.
+    - Özet çalışırken gelen istek işi "dirty" işaretler; bitince bir kez daha çalışır.
+    - Eşzamanlılık MEMORY_JOB_CONCURRENCY worker ile sınırlı.
+    """
+
+    def __init__(self, *, concurrency: int = MEMORY_JOB_CONCURRENCY,
+                 debounce_s: float = MEMORY_JOB_DEBOUNCE_S,
+                 max_pending: int = MEMORY_JOB_MAX_PENDING,
+                 max_tracked: int = MEMORY_JOB_MAX_TRACKED,
+                 refresh_every: int = MEMORY_REFRESH_EVERY):
+        self.concurrency = max(1, concurrency)
+        self.debounce_s = max(0.0, debounce_s)
+        self.max_pending = max(1, max_pending)
+        self.max_tracked = max(1, max_tracked)
+        self.refresh_every = max(1, refresh_every)
+
+        self._counts: "OrderedDict[Key, int]" = OrderedDict()  # son özetten beri yeni mesaj (LRU)
+        self._timers: Dict[Key, asyncio.TimerHandle] = {}      # debounce bekleyen işler
+        self._queued: Set[Key] = set()                         # ready kuyruğundakiler
+        self._running: Set[Key] = set()
+        self._dirty: Set[Key] = set()
+        self._ready: Optional[asyncio.Queue] = None
+        self._workers: list = []
+        self._stats = {
+            "scheduled": 0, "coalesced": 0, "dropped": 0,
+            "completed": 0, "failed": 0, "total_ms": 0.0, "evicted": 0,
+        }
+
+    # ---- Yaşam döngüsü ----
+    def start(self) -> None:
+        if self._workers:
+            return
+        self._ready = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"memory-job-{i}")
+            for i in range(self.concurrency)
+        ]
+
+    async def stop(self) -> None:
+        for h in self._timers.values():
+            h.cancel()
+        self._timers.clear()
+        for w in self._workers:
+            w.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._ready = None
+        self._queued.clear()
+
+    # ---- Planlama ----
+    def note_messages(self, uid: str, thread_id: str, n: int = 1) -> None:
+        """Thread'e n mesaj yazıldı; eşik aşıldıysa özet planla"""
+        if not MEMORY_ENABLED:
+            return
+        key = (uid, thread_id)
+        count = self._counts.get(key, 0) + n
+        if count < self.refresh_every:
+            self._counts[key] = count
+            self._counts.move_to_end(key)
+            if len(self._counts) > self.max_tracked:
+                self._counts.popitem(last=False)
+                self._stats["evicted"] += 1
+            return
+        # Eşiği aşan mesajlar bir sonraki özete sayılır (n=2'li yanıtlar kadansı kaydırmaz)
+        rest = count % self.refresh_every
+        if rest:
+            self._counts[key] = rest
+            self._counts.move_to_end(key)
+        else:
+            self._counts.pop(key, None)
+        self.schedule(uid, thread_id)
+
+    def schedule(self, uid: str, thread_id: str) -> None:
+        key = (uid, thread_id)
+        self.start()
+
+        if key in self._running:
+            self._dirty.add(key)
+            self._stats["coalesced"] += 1
+            return
+        if key in self._queued:
+            self._stats["coalesced"] += 1
+            return
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+            self._stats["coalesced"] += 1
+        elif self._pending_count() >= self.max_pending:
+            self._stats["dropped"] += 1
+            return
+        else:
+            self._stats["scheduled"] += 1
+
+        loop = asyncio.get_running_loop()
+        self._timers[key] = loop.call_later(self.debounce_s, self._enqueue, key)
+
+    def _enqueue(self, key: Key) -> None:
+        self._timers.pop(key, None)
+        if self._ready is None:
+            return
+        self._queued.add(key)
+        self._ready.put_nowait(key)
+
+    def _pending_count(self) -> int:
+        return len(self._timers) + len(self._queued)
+
+    # ---- Çalıştırma ----
+    async def _worker(self) -> None:
+        while True:
+            key = await self._ready.get()
+            self._queued.discard(key)
+            self._running.add(key)
+            t0 = time.perf_counter()
+            try:
+                await self._run(*key)
+                self._stats["completed"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._stats["failed"] += 1
+                print(f"Memory özeti başarısız ({key[1]}): {e}")
+            finally:
+                self._stats["total_ms"] += (time.perf_counter() - t0) * 1000
+                self._running.discard(key)
+                if key in self._dirty:
+                    self._dirty.discard(key)
+                    self.schedule(*key)
+
+    async def _run(self, uid: str, thread_id: str) -> None:
+        recent = await fetch_recent_messages(uid, thread_id, limit_n=MEMORY_RECENT_LIMIT)
+        if recent:
+            await summarize_into_memory(uid, thread_id, recent)
+
+    def stats(self) -> dict:
+        done = self._stats["completed"] + self._stats["failed"]
+        return {
+            "concurrency": self.concurrency,
+            "debounce_s": self.debounce_s,
+            "refresh_every": self.refresh_every,
+            "debouncing": len(self._timers),
+            "queued": len(self._queued),
+            "running": len(self._running),
+            "tracked_threads": len(self._counts),
+            "max_tracked": self.max_tracked,
+            "evicted": self._stats["evicted"],
+            "scheduled": self._stats["scheduled"],
+            "coalesced": self._stats["coalesced"],
+            "dropped": self._stats["dropped"],
+            "completed": self._stats["completed"],
+            "failed": self._stats["failed"],
+            "avg_ms": round(self._stats["total_ms"] / done, 1) if done else None,
+        }
+
+
+memory_jobs = MemoryJobQueue()
@@ -0,0 +1,96 @@
+# stream_parser.py
+# LLM'in structured JSON cevabı akarken sadece "content" alanının metnini artımlı çıkarır
+
+import re
+from typing import Optional
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class ContentFieldStreamer:
+    """
+    Model çıktısı {"diagnosisTr": "...", "content": "...", "notes": [...]} biçiminde
+    token token gelir. feed() her çağrıda content string'inin yeni çözülen kısmını
+    döndürür (JSON kaçışları çözülmüş halde). Çıktı JSON değilse (model formatı
+    bozduysa) metin olduğu gibi akıtılır.
+    """
+
+    def __init__(self, field: str = "content"):
+        self._key = re.compile(r'(?<!\\)"' + re.escape(field) + r'"\s*:\s*"')
+        self._buf = ""
+        self._pos = 0
+        self._state = "seek"    # seek → string → done | raw
+
+    def feed(self, text: str) -> str:
+        self._buf += text
+
+        if self._state == "seek":
+            head = self._buf.lstrip()
+            if head and not head.startswith(("{", "`")):
+                # JSON değil: düz metin olarak akıt
+                self._state = "raw"
+                self._pos = len(self._buf)
+                return self._buf
+            m = self._key.search(self._buf)
+            if not m:
+                return ""
+            self._state = "string"
+            self._pos = m.end()
+
+        if self._state == "raw":
+            out = self._buf[self._pos:]
+            self._pos = len(self._buf)
+            return out
+
+        if self._state == "string":
+            return self._read_string()
+        return ""
+
+    def _read_string(self) -> str:
+        buf, i, out = self._buf, self._pos, []
+        while i < len(buf):
+            c = buf[i]
+            if c == '"':
+                self._state = "done"
+                i += 1
+                break
+            if c != "\\":
+                out.append(c)
+                i += 1
+                continue
+            # Kaçış dizisi: tamamı gelmeden çözme
+            if i + 1 >= len(buf):
+                break
+            n = buf[i + 1]
+            if n != "u":
+                out.append(_ESCAPES.get(n, n))
+                i += 2
+                continue
+            ch, used = self._read_unicode(buf, i)
+            if ch is None:
+                break
+            out.append(ch)
+            i += used
+        self._pos = i
+        return "".join(out)
+
+    @staticmethod
+    def _read_unicode(buf: str, i: int) -> tuple[Optional[str], int]:
+        """\\uXXXX (ve surrogate çifti) → (karakter, tüketilen uzunluk); eksikse (None, 0)"""
+        if i + 6 > len(buf):
+            return None, 0
+        try:
+            code = int(buf[i + 2:i + 6], 16)
+        except ValueError:
+            return buf[i:i + 6], 6
+        if 0xD800 <= code < 0xDC00:
+            if i + 12 > len(buf):
+                return None, 0
+            if buf[i + 6:i + 8] == "\\u":
+                try:
+                    low = int(buf[i + 8:i + 12], 16)
+                except ValueError:
+                    low = 0
+                if 0xDC00 <= low < 0xE000:
+                    return chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)), 12
+        return chr(code), 6
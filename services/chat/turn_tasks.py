@@ -0,0 +1,52 @@
+# turn_tasks.py
+# Sohbet turunun kritik yol dışındaki işleri (başlık, kalıcılık, hafıza) için arka plan task'ları
+
+import asyncio
+import os
+from typing import Awaitable, Optional, Set
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Kapanışta bekleyen arka plan işleri için üst süre
+TURN_TASKS_DRAIN_TIMEOUT_S = float(os.getenv("TURN_TASKS_DRAIN_TIMEOUT_S", "10"))
+
+# asyncio yalnızca zayıf referans tutar: referanssız task GC ile yarıda kalabilir
+_tasks: Set[asyncio.Task] = set()
+_stats = {"spawned": 0, "failed": 0}
+
+
+def _on_done(task: asyncio.Task) -> None:
+    _tasks.discard(task)
+    if task.cancelled():
+        return
+    exc = task.exception()
+    if exc is not None:
+        _stats["failed"] += 1
+        print(f"Arka plan görevi başarısız ({task.get_name()}): {exc}")
+
+
+def spawn(coro: Awaitable, *, name: Optional[str] = None) -> asyncio.Task:
+    """Coroutine'i arka planda başlat; hata loglanır, cevap akışını bozmaz"""
+    task = asyncio.ensure_future(coro)
+    if name:
+        task.set_name(name)
+    _tasks.add(task)
+    _stats["spawned"] += 1
+    task.add_done_callback(_on_done)
+    return task
+
+
+async def drain(timeout_s: float = TURN_TASKS_DRAIN_TIMEOUT_S) -> None:
+    """Lifespan sonunda: bekleyen yazma/özet işlerinin bitmesine süre tanı, kalanları iptal et"""
+    if not _tasks:
+        return
+    pending = list(_tasks)
+    _, not_done = await asyncio.wait(pending, timeout=timeout_s)
+    for task in not_done:
+        task.cancel()
+
+
+def stats() -> dict:
+    return {"pending": len(_tasks), **_stats}
@@ -0,0 +1,110 @@
+# codec.py
+# WS frame kodlaması: init mesajında seçilen protokol (json | msgpack, opsiyonel deflate)
+
+import os
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from services.serialization import dumps, loads
+
+try:  # opsiyonel bağımlılık: yoksa msgpack isteyen istemciler json'a düşer
+    import msgpack
+except ImportError:
+    msgpack = None
+
+load_dotenv()
+
+# === Kodlama Ayarları ===
+WS_DEFLATE_LEVEL = int(os.getenv("WS_DEFLATE_LEVEL", "6"))
+# json+deflate'te bundan küçük frame'ler sıkıştırılmadan text gider (delta gibi kısa frame'ler)
+WS_DEFLATE_MIN_BYTES = int(os.getenv("WS_DEFLATE_MIN_BYTES", "256"))
+
+ENCODINGS = ("json", "msgpack")
+
+# (encoding, compress)
+Variant = Tuple[str, bool]
+DEFAULT_VARIANT: Variant = ("json", False)
+
+
+def negotiate(encoding: Optional[str], compress: Optional[str]) -> Variant:
+    """
+    init mesajındaki tercih → sunucunun kullanacağı varyant. Desteklenmeyen
+    değerler varsayılana (düz JSON) düşer; seçilen varyant thread_ready'de döner.
+    """
+    enc = (encoding or "json").lower()
+    if enc not in ENCODINGS or (enc == "msgpack" and msgpack is None):
+        enc = "json"
+    return enc, (compress or "").lower() == "deflate"
+
+
+def _deflate(data: bytes) -> bytes:
+    # Ham deflate (zlib başlığı yok), frame başına bağımsız: kodlama yayın başına bir
+    # kez yapılıp tüm socket'lere aynı byte'lar gider (bağlantı başına sözlük yok)
+    c = zlib.compressobj(WS_DEFLATE_LEVEL, zlib.DEFLATED, -15)
+    return c.compress(data) + c.flush()
+
+
+def encode(payload: Dict[str, Any], variant: Variant, raw: Optional[bytes] = None):
+    """
+    Payload'ı varyanta göre kodla. Dönen değer str ise text frame (her zaman JSON),
+    bytes ise binary frame (msgpack ve/veya deflate). raw: hazır JSON byte'ları.
+    """
+    enc, compress = variant
+    if enc == "msgpack":
+        data = msgpack.packb(payload, use_bin_type=True)
+        return _deflate(data) if compress else data
+    if raw is None:
+        raw = dumps(payload).encode("utf-8")
+    if compress and len(raw) >= WS_DEFLATE_MIN_BYTES:
+        return _deflate(raw)
+    return raw.decode("utf-8")
+
+
+class Frame:
+    """
+    Bir yayının kodlanmış halleri: her varyant ilk isteyen bağlantıda bir kez
+    kodlanır, odadaki diğer socket'ler aynı nesneyi alır. Pub/sub'dan gelen
+    yayınlarda yalnızca JSON metni vardır; payload gerekirse bir kez parse edilir.
+    """
+
+    __slots__ = ("_payload", "_raw", "_text", "_encoded")
+
+    def __init__(self, payload: Optional[Dict[str, Any]] = None, text: Optional[str] = None):
+        self._payload = payload
+        self._text = text
+        self._raw: Optional[bytes] = None
+        self._encoded: Dict[Variant, tuple] = {}
+
+    @property
+    def payload(self) -> Dict[str, Any]:
+        if self._payload is None:
+            self._payload = loads(self._text)
+        return self._payload
+
+    @property
+    def raw(self) -> bytes:
+        """JSON'un UTF-8 byte'ları (wire boyutu için ayrıca encode edilmez)"""
+        if self._raw is None:
+            self._raw = self.text.encode("utf-8")
+        return self._raw
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = dumps(self._payload)
+        return self._text
+
+    def get(self, variant: Variant) -> tuple:
+        """(data, wire byte sayısı); data str → send_text, bytes → send_bytes"""
+        item = self._encoded.get(variant)
+        if item is None:
+            if variant == DEFAULT_VARIANT:
+                item = (self.text, len(self.raw))
+            else:
+                data = encode(self.payload if variant[0] == "msgpack" else None, variant,
+                              self.raw if variant[0] == "json" else None)
+                item = (data, len(data) if isinstance(data, bytes) else len(self.raw))
+            self._encoded[variant] = item
+        return item
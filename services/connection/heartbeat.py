@@ -0,0 +1,105 @@
+# heartbeat.py
+# Sunucu taraflı WS heartbeat: tüm bağlantılar için tek timer task'lı zamanlama çarkı
+
+import asyncio
+import os
+import time
+from typing import Callable, List, Optional, Set
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# === Heartbeat Ayarları ===
+WS_PING_INTERVAL_S = float(os.getenv("WS_PING_INTERVAL_S", "25"))      # sessiz bağlantıya ping aralığı
+WS_IDLE_TIMEOUT_S = float(os.getenv("WS_IDLE_TIMEOUT_S", "75"))        # bu kadar süre ses yoksa kapat
+WS_HEARTBEAT_TICK_S = float(os.getenv("WS_HEARTBEAT_TICK_S", "1"))     # çarkın dönme aralığı
+
+
+class HeartbeatWheel:
+    """
+    Bağlantılar interval/tick kadar kovaya dağıtılır; tek task her tick'te bir
+    kovayı işler. Böylece her bağlantı interval'de bir kez kontrol edilir, iş
+    tick'lere yayılır ve bağlantı başına task/timer açılmaz. Ekleme/çıkarma O(1).
+
+    Yalnızca init'te heartbeat: true gönderen (pong'u bilen) bağlantılar eklenir.
+    Kayıtların last_seen (monotonic), busy ve hb_slot alanları olmalı
+    (websocket_manager.Connection). Gelen her mesaj last_seen'i günceller;
+    busy iken (tur işleniyor, receive beklenmiyor) bağlantı kapatılmaz.
+    """
+
+    def __init__(self, *, on_ping: Callable, on_idle: Callable,
+                 interval_s: float = WS_PING_INTERVAL_S, idle_timeout_s: float = WS_IDLE_TIMEOUT_S,
+                 tick_s: float = WS_HEARTBEAT_TICK_S):
+        self.interval_s = interval_s
+        self.idle_timeout_s = idle_timeout_s
+        self.tick_s = tick_s
+        self._on_ping = on_ping
+        self._on_idle = on_idle
+        self._slots: List[Set] = [set() for _ in range(max(1, round(interval_s / tick_s)))]
+        self._cursor = 0
+        self._tracked = 0
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"ticks": 0, "pings_sent": 0, "reaped": 0}
+
+    def add(self, conn) -> None:
+        # İmlecin hemen arkasındaki kova: ilk kontrol tam bir interval sonra
+        conn.hb_slot = (self._cursor - 1) % len(self._slots)
+        self._slots[conn.hb_slot].add(conn)
+        self._tracked += 1
+
+    def remove(self, conn) -> None:
+        if conn.hb_slot is None:
+            return
+        bucket = self._slots[conn.hb_slot]
+        if conn in bucket:
+            bucket.discard(conn)
+            self._tracked -= 1
+        conn.hb_slot = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="ws-heartbeat")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while True:
+            # Sabit aralık: tick işleme süresi bir sonrakini kaydırmaz
+            deadline += self.tick_s
+            await asyncio.sleep(max(0.0, deadline - loop.time()))
+            try:
+                self.tick(time.monotonic())
+            except Exception as e:
+                print(f"WS heartbeat hatası: {e}")
+
+    def tick(self, now: float) -> None:
+        bucket = self._slots[self._cursor]
+        self._cursor = (self._cursor + 1) % len(self._slots)
+        self._stats["ticks"] += 1
+        for conn in list(bucket):
+            if conn.busy:
+                continue
+            silent = now - conn.last_seen
+            if silent > self.idle_timeout_s:
+                self.remove(conn)
+                self._stats["reaped"] += 1
+                self._on_idle(conn)
+            elif silent >= self.interval_s:
+                self._stats["pings_sent"] += 1
+                self._on_ping(conn)
+
+    def stats(self) -> dict:
+        return {
+            "interval_s": self.interval_s,
+            "idle_timeout_s": self.idle_timeout_s,
+            "slots": len(self._slots),
+            "tracked": self._tracked,
+            **self._stats,
+        }
@@ -0,0 +1,195 @@
+# pubsub.py
+# WebSocket yayınlarını node'lar arası dağıtmak için pub/sub backend'leri (in-process / Redis)
+
+import asyncio
+import os
+import uuid
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Optional, Set
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# === Pub/Sub Ayarları ===
+WS_PUBSUB_BACKEND = os.getenv("WS_PUBSUB_BACKEND", "memory")        # memory | redis
+WS_PUBSUB_URL = os.getenv("WS_PUBSUB_URL", "redis://localhost:6379/0")
+WS_PUBSUB_PREFIX = os.getenv("WS_PUBSUB_PREFIX", "plantly:ws")
+
+# (thread_id, serialize edilmiş payload) → bu node'daki socket'lere teslim
+Handler = Callable[[str, str], Awaitable[None]]
+
+
+class PubSubBackend(ABC):
+    """
+    Oda (thread) başına kanal. WebSocketManager oda bu node'da ilk socket'i
+    aldığında subscribe, son socket gidince unsubscribe eder; böylece her node
+    yalnızca barındırdığı odaların yayınlarını alır (sticky routing gerekmez).
+    Yerel socket'lere teslimat publish eden node'da doğrudan yapılır; backend
+    yalnızca diğer node'lara taşır.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self._handler: Optional[Handler] = None
+        self.node_id = uuid.uuid4().hex[:12]
+        self.published = 0
+        self.received = 0
+
+    def set_handler(self, handler: Handler) -> None:
+        self._handler = handler
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    @abstractmethod
+    async def subscribe(self, thread_id: str) -> None:
+        ...
+
+    @abstractmethod
+    async def unsubscribe(self, thread_id: str) -> None:
+        ...
+
+    @abstractmethod
+    async def publish(self, thread_id: str, data: str) -> None:
+        ...
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "node_id": self.node_id,
+                "published": self.published, "received": self.received}
+
+
+class InProcessPubSub(PubSubBackend):
+    """Tek process: yerel teslimat zaten yapıldığı için publish no-op"""
+
+    name = "memory"
+
+    def __init__(self):
+        super().__init__()
+        self._channels: Set[str] = set()
+
+    async def subscribe(self, thread_id: str) -> None:
+        self._channels.add(thread_id)
+
+    async def unsubscribe(self, thread_id: str) -> None:
+        self._channels.discard(thread_id)
+
+    async def publish(self, thread_id: str, data: str) -> None:
+        self.published += 1
+
+    def stats(self) -> dict:
+        return {**super().stats(), "channels": len(self._channels)}
+
+
+class RedisPubSub(PubSubBackend):
+    """
+    Redis PUBLISH/SUBSCRIBE. Mesaj zarfı "<node_id>|<payload>": node kendi
+    yayınını tekrar teslim etmez. Testlerde client olarak tests/fake_redis.py'deki
+    süreç içi stand-in (ya da fakeredis.aioredis.FakeRedis()) verilir.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str = WS_PUBSUB_URL, *, prefix: str = WS_PUBSUB_PREFIX, client=None):
+        super().__init__()
+        self.url = url
+        self.prefix = prefix
+        self._redis = client
+        self._owns_client = client is None
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+        self._channels: Set[str] = set()
+        self._has_channels = asyncio.Event()
+
+    def _channel(self, thread_id: str) -> str:
+        return f"{self.prefix}:thread:{thread_id}"
+
+    async def start(self) -> None:
+        if self._redis is None:
+            try:
+                import redis.asyncio as aioredis
+            except ImportError as e:
+                raise RuntimeError("WS_PUBSUB_BACKEND=redis için `redis` paketi gerekli") from e
+            self._redis = aioredis.from_url(self.url)
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        self._reader = asyncio.create_task(self._read_loop(), name="ws-pubsub-reader")
+
+    async def stop(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+            await asyncio.gather(self._reader, return_exceptions=True)
+            self._reader = None
+        if self._pubsub is not None:
+            close = getattr(self._pubsub, "aclose", None) or self._pubsub.close
+            await close()
+            self._pubsub = None
+        if self._owns_client and self._redis is not None:
+            close = getattr(self._redis, "aclose", None) or self._redis.close
+            await close()
+            self._redis = None
+        self._channels.clear()
+        self._has_channels.clear()
+
+    async def subscribe(self, thread_id: str) -> None:
+        if thread_id in self._channels:
+            return
+        self._channels.add(thread_id)
+        await self._pubsub.subscribe(self._channel(thread_id))
+        self._has_channels.set()
+
+    async def unsubscribe(self, thread_id: str) -> None:
+        if thread_id not in self._channels:
+            return
+        self._channels.discard(thread_id)
+        await self._pubsub.unsubscribe(self._channel(thread_id))
+        if not self._channels:
+            self._has_channels.clear()
+
+    async def publish(self, thread_id: str, data: str) -> None:
+        await self._redis.publish(self._channel(thread_id), f"{self.node_id}|{data}")
+        self.published += 1
+
+    async def _read_loop(self) -> None:
+        strip = len(self.prefix) + len(":thread:")
+        while True:
+            # Abonelik yokken get_message çağrılamaz: ilk odayı bekle
+            await self._has_channels.wait()
+            try:
+                msg = await self._pubsub.get_message(timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"WS pub/sub okuma hatası: {e}")
+                await asyncio.sleep(1.0)
+                continue
+            if not msg or msg.get("type") != "message":
+                continue
+            raw = msg["data"]
+            if isinstance(raw, bytes):
+                raw = raw.decode("utf-8")
+            origin, _, data = raw.partition("|")
+            if origin == self.node_id or self._handler is None:
+                continue
+            channel = msg["channel"]
+            if isinstance(channel, bytes):
+                channel = channel.decode("utf-8")
+            self.received += 1
+            try:
+                await self._handler(channel[strip:], data)
+            except Exception as e:
+                print(f"WS pub/sub teslim hatası: {e}")
+
+    def stats(self) -> dict:
+        return {**super().stats(), "channels": len(self._channels)}
+
+
+def create_pubsub(kind: str = WS_PUBSUB_BACKEND) -> PubSubBackend:
+    if kind == "memory":
+        return InProcessPubSub()
+    if kind == "redis":
+        return RedisPubSub()
+    raise ValueError(f"Bilinmeyen WS_PUBSUB_BACKEND: {kind}")
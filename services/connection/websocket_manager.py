@@ -1,46 +1,322 @@
 # websocket_manager.py
 # WebSocket bağlantı yöneticisi
 
-import json
-from typing import Dict, Set, Any
+import asyncio
+import os
+import time
+from typing import Dict, Set, Any, List, Optional
 from fastapi import WebSocket
+from dotenv import load_dotenv
+
+from .codec import DEFAULT_VARIANT, Frame, Variant
+from .heartbeat import HeartbeatWheel
+from .pubsub import PubSubBackend, create_pubsub
+
+load_dotenv()
+
+# === Gönderim Ayarları ===
+WS_SEND_QUEUE_MAX = int(os.getenv("WS_SEND_QUEUE_MAX", "64"))              # bağlantı başına bekleyen frame
+WS_SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER_POLICY", "drop")     # drop: bağlantıyı kapat, flag: frame'i at
+WS_SLOW_CONSUMER_CLOSE_CODE = 1013                                         # "Try Again Later"
+WS_IDLE_CLOSE_CODE = 1001                                                  # "Going Away"
+WS_CLOSE_TIMEOUT_S = 5.0
+
+
+class Connection:
+    """
+    Bağlantı kaydı: kimlik (uid, thread), sayaçlar ve sınırlı gönderim kuyruğu +
+    tek yazıcı task (send'ler sıralı, eşzamanlı değil). __slots__ ile kayıt
+    başına __dict__ tutulmaz.
+    """
+
+    __slots__ = (
+        "websocket", "uid", "thread_id", "connected_at",
+        "queue", "writer", "frames_sent", "bytes_sent", "dropped", "flagged",
+        "last_seen", "busy", "hb_slot", "variant",
+    )
+
+    def __init__(self, websocket: WebSocket, uid: Optional[str], thread_id: str, maxsize: int,
+                 variant: Variant = DEFAULT_VARIANT):
+        self.websocket = websocket
+        self.uid = uid
+        self.thread_id = thread_id
+        self.variant = variant    # (encoding, compress): init'te seçilen protokol
+        self.connected_at = time.time()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)   # (str | bytes, wire byte sayısı)
+        self.writer: Optional[asyncio.Task] = None
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.dropped = 0          # kuyruk dolduğu için atılan frame
+        self.flagged = False      # en az bir kez yavaş tüketici olarak işaretlendi
+        self.last_seen = time.monotonic()   # son gelen mesaj (heartbeat)
+        self.busy = False                   # tur işleniyor: receive beklenmiyor, idle sayılmaz
+        self.hb_slot: Optional[int] = None  # HeartbeatWheel kovası
+
+    def info(self) -> dict:
+        return {
+            "uid": self.uid,
+            "thread_id": self.thread_id,
+            "encoding": self.variant[0],
+            "compress": self.variant[1],
+            "connected_at": self.connected_at,
+            "frames_sent": self.frames_sent,
+            "bytes_sent": self.bytes_sent,
+            "depth": self.queue.qsize(),
+            "dropped": self.dropped,
+        }
 
 
 class WebSocketManager:
-    """WebSocket bağlantılarını yönetir"""
-    
-    def __init__(self):
-        self.rooms: Dict[str, Set[WebSocket]] = {}
+    """
+    WebSocket bağlantılarını yönetir. Kayıtlar socket, thread ve uid'e göre
+    indekslenir (ekleme/silme/arama O(1)); toplamlar sayaçlarla tutulur.
+    Yayınlar yerel socket'lere doğrudan, diğer node'lara pub/sub backend'i
+    üzerinden gider (WS_PUBSUB_BACKEND). init'te heartbeat isteyen bağlantılara
+    sessiz kaldıklarında ping atılır, WS_IDLE_TIMEOUT_S boyunca ses gelmeyenler
+    kapatılır (HeartbeatWheel). Diğerlerinde canlılık transport seviyesindedir
+    (uvicorn'un WS protokol ping/pong'u).
+    """
 
-    async def connect(self, thread_id: str, websocket: WebSocket):
-        """WebSocket'i belirli bir thread'e bağla"""
+    def __init__(self, *, queue_max: int = WS_SEND_QUEUE_MAX, slow_policy: str = WS_SLOW_CONSUMER_POLICY,
+                 pubsub: Optional[PubSubBackend] = None, heartbeat: Optional[HeartbeatWheel] = None):
+        self.queue_max = queue_max
+        self.slow_policy = slow_policy
+        self.pubsub = pubsub or create_pubsub()
+        self.pubsub.set_handler(self._deliver_local)
+        self._by_socket: Dict[WebSocket, Connection] = {}
+        self._by_thread: Dict[str, Set[Connection]] = {}
+        self._by_uid: Dict[str, Set[Connection]] = {}
+        self.heartbeat = heartbeat or HeartbeatWheel(on_ping=self._ping, on_idle=self._reap)
+        self._background: Set[asyncio.Task] = set()
+        self._bytes_sent = 0
+        self._stats = {"slow_dropped": 0, "frames_dropped": 0, "send_errors": 0, "publish_errors": 0}
+
+    async def start(self):
+        """FastAPI lifespan başında: pub/sub bağlantısını aç, heartbeat çarkını başlat"""
+        await self.pubsub.start()
+        self.heartbeat.start()
+
+    async def stop(self):
+        await self.heartbeat.stop()
+        await self.pubsub.stop()
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.ensure_future(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    # ---- Kayıt ----
+    async def connect(self, thread_id: str, websocket: WebSocket, uid: Optional[str] = None,
+                      variant: Variant = DEFAULT_VARIANT, heartbeat: bool = False) -> Connection:
+        """WebSocket'i belirli bir thread'e (ve kullanıcıya) bağla"""
         # accept() sadece chat_ws içinde yapılır
-        self.rooms.setdefault(thread_id, set()).add(websocket)
+        conn = Connection(websocket, uid, thread_id, self.queue_max, variant)
+        new_room = thread_id not in self._by_thread
+        self._by_socket[websocket] = conn
+        self._by_thread.setdefault(thread_id, set()).add(conn)
+        if uid:
+            self._by_uid.setdefault(uid, set()).add(conn)
+        conn.writer = asyncio.create_task(self._writer(conn), name=f"ws-writer:{thread_id}")
+        if heartbeat:
+            # Uygulama seviyesi ping/pong sözleşmesini bilen istemciler (opt-in)
+            self.heartbeat.add(conn)
+        if new_room:
+            # Oda bu node'da ilk kez açıldı: diğer node'ların yayınlarını almaya başla
+            await self.pubsub.subscribe(thread_id)
+        return conn
 
     def disconnect(self, thread_id: str, websocket: WebSocket):
         """WebSocket bağlantısını kapat"""
-        if thread_id in self.rooms and websocket in self.rooms[thread_id]:
-            self.rooms[thread_id].remove(websocket)
-        if thread_id in self.rooms and not self.rooms[thread_id]:
-            self.rooms.pop(thread_id, None)
+        conn = self._by_socket.pop(websocket, None)
+        if conn is None:
+            return
+        self.heartbeat.remove(conn)
+        room = self._by_thread.get(conn.thread_id)
+        if room is not None:
+            room.discard(conn)
+            if not room:
+                del self._by_thread[conn.thread_id]
+                self._spawn(self._unsubscribe_if_empty(conn.thread_id))
+        if conn.uid:
+            conns = self._by_uid.get(conn.uid)
+            if conns is not None:
+                conns.discard(conn)
+                if not conns:
+                    del self._by_uid[conn.uid]
+        if conn.writer is not None and conn.writer is not asyncio.current_task():
+            conn.writer.cancel()
 
-    async def broadcast(self, thread_id: str, payload: Dict[str, Any]):
-        """Thread'deki tüm WebSocket'lere mesaj gönder"""
-        dead = []
-        for ws in self.rooms.get(thread_id, []):
+    async def _unsubscribe_if_empty(self, thread_id: str):
+        # Bu arada aynı odaya yeni socket geldiyse abonelik kalsın
+        if thread_id in self._by_thread:
+            return
+        try:
+            await self.pubsub.unsubscribe(thread_id)
+        except Exception as e:
+            print(f"WS pub/sub unsubscribe hatası ({thread_id}): {e}")
+
+    def touch(self, websocket: WebSocket, *, busy: bool) -> None:
+        """Gelen mesaj / tur sınırı: chat_ws receive öncesi busy=False, sonrası busy=True"""
+        conn = self._by_socket.get(websocket)
+        if conn is not None:
+            conn.last_seen = time.monotonic()
+            conn.busy = busy
+
+    def get(self, websocket: WebSocket) -> Optional[Connection]:
+        return self._by_socket.get(websocket)
+
+    def connections_for_thread(self, thread_id: str) -> List[Connection]:
+        return list(self._by_thread.get(thread_id, ()))
+
+    def connections_for_uid(self, uid: str) -> List[Connection]:
+        return list(self._by_uid.get(uid, ()))
+
+    # ---- Gönderim ----
+    async def _writer(self, conn: Connection):
+        ws = conn.websocket
+        while True:
+            data, nbytes = await conn.queue.get()
             try:
-                await ws.send_text(json.dumps(payload, ensure_ascii=False))
+                if isinstance(data, bytes):
+                    await ws.send_bytes(data)
+                else:
+                    await ws.send_text(data)
+                conn.frames_sent += 1
+                conn.bytes_sent += nbytes
+                self._bytes_sent += nbytes
             except Exception:
-                dead.append(ws)
-        
-        # Ölü bağlantıları temizle
-        for ws in dead:
-            self.disconnect(thread_id, ws)
+                # Ölü bağlantı: odadan çıkar (chat_ws'in receive döngüsü de kapanır)
+                self._stats["send_errors"] += 1
+                self.disconnect(conn.thread_id, ws)
+                return
+            finally:
+                conn.queue.task_done()
+
+    def _enqueue(self, conn: Connection, frame: Frame) -> None:
+        try:
+            conn.queue.put_nowait(frame.get(conn.variant))
+            return
+        except asyncio.QueueFull:
+            pass
+        conn.flagged = True
+        if self.slow_policy == "flag":
+            conn.dropped += 1
+            self._stats["frames_dropped"] += 1
+            return
+        # Yavaş tüketici: diğer cihazları bekletmemek için bağlantıyı kapat
+        self._stats["slow_dropped"] += 1
+        self.disconnect(conn.thread_id, conn.websocket)
+        self._spawn(self._close(conn.websocket, WS_SLOW_CONSUMER_CLOSE_CODE))
+
+    @staticmethod
+    async def _close(websocket: WebSocket, code: int):
+        # Yarı açık TCP'de close asılı kalabilir; süre sınırlı
+        try:
+            await asyncio.wait_for(websocket.close(code=code), WS_CLOSE_TIMEOUT_S)
+        except Exception:
+            pass
+
+    # ---- Heartbeat ----
+    def _ping(self, conn: Connection) -> None:
+        # İstemci {"type": "pong"} (ya da herhangi bir mesaj) ile cevaplar
+        self._enqueue(conn, Frame({"type": "ping", "ts": int(time.time() * 1000)}))
+
+    def _reap(self, conn: Connection) -> None:
+        """Idle bağlantı: kayıttan çıkar (kuyruk/yazıcı serbest), socket'i kapat.
+        chat_ws'in receive'i ASGI sunucusu transport'u kapatınca WebSocketDisconnect alır."""
+        self.disconnect(conn.thread_id, conn.websocket)
+        self._spawn(self._close(conn.websocket, WS_IDLE_CLOSE_CODE))
+
+    async def drain(self, websocket: WebSocket, timeout: float = 1.0):
+        """Kapatmadan önce kuyruktaki frame'lerin (örn. son hata mesajı) gitmesini kısa süre bekle"""
+        conn = self._by_socket.get(websocket)
+        if conn is None:
+            return
+        try:
+            await asyncio.wait_for(conn.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def send(self, websocket: WebSocket, payload: Dict[str, Any]):
+        """Tek bağlantıya gönder (aynı kuyruktan: broadcast frame'leriyle sırası korunur)"""
+        conn = self._by_socket.get(websocket)
+        frame = Frame(payload)
+        if conn is None:
+            await websocket.send_text(frame.text)
+            return
+        self._enqueue(conn, frame)
 
+    async def broadcast(self, thread_id: str, payload: Dict[str, Any]):
+        """Thread'deki tüm WebSocket'lere mesaj gönder: varyant başına bir kez kodla, kuyruklara eşzamanlı dağıt"""
+        frame = Frame(payload)
+        self._fan_out(self._by_thread.get(thread_id), frame)
+        # Aynı odadaki diğer node'lardaki socket'ler (ör. analyze_image başka pod'a düştüyse)
+        try:
+            await self.pubsub.publish(thread_id, frame.text)
+        except Exception as e:
+            self._stats["publish_errors"] += 1
+            print(f"WS pub/sub publish hatası ({thread_id}): {e}")
+
+    async def send_to_user(self, uid: str, payload: Dict[str, Any]) -> int:
+        """Kullanıcının bu node'daki tüm socket'lerine gönder (thread'den bağımsız, ör. bitki güncellemesi)"""
+        conns = self._by_uid.get(uid)
+        if not conns:
+            return 0
+        return self._fan_out(conns, Frame(payload))
+
+    async def _deliver_local(self, thread_id: str, text: str):
+        """Pub/sub'dan gelen (JSON metni) yayını bu node'daki socket'lerin kuyruklarına ekle"""
+        self._fan_out(self._by_thread.get(thread_id), Frame(text=text))
+
+    def _fan_out(self, conns: Optional[Set[Connection]], frame: Frame) -> int:
+        if not conns:
+            return 0
+        targets = list(conns)
+        for conn in targets:
+            self._enqueue(conn, frame)
+        return len(targets)
+
+    # ---- Sorgular ----
     def get_active_connections(self, thread_id: str) -> int:
         """Thread'deki aktif bağlantı sayısını döndür"""
-        return len(self.rooms.get(thread_id, set()))
+        return len(self._by_thread.get(thread_id, ()))
 
     def get_all_active_threads(self) -> list:
         """Aktif thread'lerin listesini döndür"""
-        return list(self.rooms.keys())
+        return list(self._by_thread.keys())
+
+    def counts(self) -> dict:
+        """Toplam sayılar; bağlantı sayısından bağımsız O(1)"""
+        return {
+            "connections": len(self._by_socket),
+            "threads": len(self._by_thread),
+            "users": len(self._by_uid),
+            "bytes_sent": self._bytes_sent,
+        }
+
+    @staticmethod
+    def _variant_counts(conns: List[Connection]) -> dict:
+        out: Dict[str, int] = {}
+        for c in conns:
+            key = c.variant[0] + ("+deflate" if c.variant[1] else "")
+            out[key] = out.get(key, 0) + 1
+        return out
+
+    def stats(self, top_n: int = 20) -> dict:
+        """Bağlantı/kuyruk metrikleri; en dolu top_n kuyruk ayrıca listelenir"""
+        conns = list(self._by_socket.values())
+        depths = [c.queue.qsize() for c in conns]
+        deepest = sorted(conns, key=lambda c: c.queue.qsize(), reverse=True)[:top_n]
+        return {
+            **self.counts(),
+            "queue_max": self.queue_max,
+            "slow_policy": self.slow_policy,
+            "queued_frames": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "flagged_connections": sum(1 for c in conns if c.flagged),
+            "encodings": self._variant_counts(conns),
+            **self._stats,
+            "pubsub": self.pubsub.stats(),
+            "heartbeat": self.heartbeat.stats(),
+            "deepest": [c.info() for c in deepest if c.queue.qsize()],
+        }
@@ -1,27 +1,73 @@
 # firestore_service.py
-# Firestore database işlemleri
+# Firestore database işlemleri (async: google.cloud.firestore.AsyncClient)
 
 import os
+import asyncio
 from datetime import datetime, timezone
-import time
-from typing import Optional, List, Any
+from contextlib import asynccontextmanager
+from typing import Optional, List, Any, Tuple, Callable
 from fastapi import HTTPException
 from google.cloud import firestore
 import json 
 from ..auth.firebase_auth import get_project_id
 from services.ml.class_translations import to_tr_label
+from .thread_cache import thread_cache
+from .unit_of_work import UnitOfWork, count_round_trip
 
 # Firestore client - lazy initialization için fonksiyon kullanacağız
+# AsyncClient: her round-trip event loop'u bloklamadan await edilir.
+# FIRESTORE_EMULATOR_HOST set edilirse kütüphane otomatik olarak emülatöre bağlanır.
 _fs_client = None
 
-def get_firestore_client():
-    """Firestore client'ı lazy initialization ile döndür"""
+def get_firestore_client() -> firestore.AsyncClient:
+    """Firestore AsyncClient'ı lazy initialization ile döndür (ilk kullanım event loop içinde olmalı)"""
     global _fs_client
     if _fs_client is None:
-        _fs_client = firestore.Client(project=get_project_id())
+        _fs_client = firestore.AsyncClient(project=get_project_id())
     return _fs_client
 
 
+def set_firestore_client(client) -> None:
+    """Client'ı dışarıdan ver (testlerde emülatör/in-memory fake; None → lazy yeniden oluştur)"""
+    global _fs_client
+    _fs_client = client
+
+
+@asynccontextmanager
+async def unit_of_work():
+    """
+    Bir isteğin yazımlarını tek WriteBatch'te topla:
+
+        async with unit_of_work() as uow:
+            mid = await add_message(..., uow=uow)
+            await update_last_diagnosis(..., uow=uow)
+        # blok hatasız biterse tek commit (tek round-trip)
+    """
+    uow = UnitOfWork(get_firestore_client())
+    yield uow
+    await uow.commit()
+
+
+async def _write(uow: Optional[UnitOfWork], ref, data: dict, *, merge: bool = False,
+                 update: bool = False, after: Optional[Callable[[], None]] = None) -> None:
+    """Yazımı uow varsa batch'e ekle (commit'te gider), yoksa hemen gönder; after cache'i günceller"""
+    if uow is not None:
+        if update:
+            uow.update(ref, data)
+        else:
+            uow.set(ref, data, merge=merge)
+        if after is not None:
+            uow.on_commit(after)
+        return
+    count_round_trip()
+    if update:
+        await ref.update(data)
+    else:
+        await ref.set(data, merge=merge)
+    if after is not None:
+        after()
+
+
 def threads_col(uid: str):
     """Kullanıcının thread koleksiyonunu döndür"""
     return get_firestore_client().collection("users").document(uid).collection("threads")
@@ -47,7 +93,12 @@ def plant_ref(uid: str, plant_id: str):
     return plants_col(uid).document(plant_id)
 
 
-def update_plant_disease(
+def disease_history_col(uid: str, plant_id: str):
+    """Bitkinin teşhis geçmişi: users/{uid}/plants/{plant_id}/diseaseHistory/{auto_id}"""
+    return plant_ref(uid, plant_id).collection("diseaseHistory")
+
+
+async def update_plant_disease(
     uid: str,
     plant_id: str,
     *,
@@ -56,11 +107,12 @@ def update_plant_disease(
     conf: float,
     thread_id: Optional[str] = None,
     image_ref: Optional[str] = None,
+    uow: Optional[UnitOfWork] = None,
 ) -> None:
     """Bitkinin hastalık alanını (son teşhis) güncelle.
 
-    Firestore path: users/{uid}/plants/{plant_id}
-    Alanlar merge edilir; doküman yoksa oluşturulur.
+    Firestore path: users/{uid}/plants/{plant_id} (+ /diseaseHistory/{auto_id})
+    Alanlar merge edilir; doküman yoksa oluşturulur (önceden okuma yok).
     """
     if not plant_id:
         return
@@ -77,49 +129,64 @@ def update_plant_disease(
 
     ref = plant_ref(uid, plant_id)
 
-    # diseaseHistory: map (keyed) + lastDisease: map
-    # Key example: 1734631234567 (ms since epoch) to keep ordering-friendly keys.
-    key = str(int(time.time() * 1000))
-
-    snap = ref.get()
-    if not snap.exists:
-        ref.set(
-            {
-                "lastDisease": entry,
-                "diseaseHistory": {key: entry},
-            },
-            merge=True,
-        )
+    # lastDisease bitki dokümanında (merge, önceden okuma yok); geçmiş alt koleksiyonda
+    # her teşhis ayrı doküman: bitki dokümanı büyümez, okuma son N kayıtla sınırlı.
+    if uow is not None:
+        uow.set(ref, {"lastDisease": entry}, merge=True)
+        uow.set(disease_history_col(uid, plant_id).document(), entry)
         return
-
-    # Ensure lastDisease always updated; add one new history entry without overwriting the whole map.
-    ref.set({"lastDisease": entry}, merge=True)
-    ref.update({f"diseaseHistory.{key}": entry})
+    async with unit_of_work() as own:
+        own.set(ref, {"lastDisease": entry}, merge=True)
+        own.set(disease_history_col(uid, plant_id).document(), entry)
 
 
-def ensure_thread(
+async def ensure_thread(
     uid: str,
     thread_id: Optional[str],
     *,
     new_thread: bool = False,
-    initial_meta: Optional[dict] = None
+    initial_meta: Optional[dict] = None,
+    acquire: bool = False
 ) -> str:
     """
     Thread'i garanti et:
     - thread_id verilirse: doğrula/yoksa oluştur.
     - new_thread=True ise: her zaman YENİ thread aç.
     - aksi halde: var olan ilk thread'i kullan; yoksa oluştur.
+
+    acquire=True: thread dokümanı oturum cache'ine alınır (okunan/yazılan
+    doküman tekrar okunmaz); oturum sonunda release_thread() çağrılmalı.
     """
+    tid, doc = await _ensure_thread(uid, thread_id, new_thread=new_thread, initial_meta=initial_meta)
+    if acquire:
+        thread_cache.acquire(uid, tid)
+        if doc is not None:
+            thread_cache.set_doc(uid, tid, doc)
+    return tid
+
+
+async def _ensure_thread(
+    uid: str,
+    thread_id: Optional[str],
+    *,
+    new_thread: bool,
+    initial_meta: Optional[dict]
+) -> Tuple[str, Optional[dict]]:
+    """(thread_id, doküman) döndürür; doküman cache'te zaten tazeyse None"""
     ALWAYS_NEW_THREAD_ON_INIT = os.getenv("ALWAYS_NEW_THREAD_ON_INIT", "0") == "1"
     col = threads_col(uid)
 
     # 1) Belirli bir thread istenmişse
     if thread_id:
+        # Aynı thread'e açık başka bir oturum varsa varlığı zaten biliniyor
+        if thread_cache.get_doc(uid, thread_id) is not None:
+            return thread_id, None
         ref = col.document(thread_id)
-        snap = ref.get()
+        count_round_trip()
+        snap = await ref.get()
         if not snap.exists:
             raise HTTPException(status_code=404, detail="Thread not found")
-        return thread_id
+        return thread_id, snap.to_dict() or {}
 
     # 2) Zorla yeni thread
     if new_thread or ALWAYS_NEW_THREAD_ON_INIT:
@@ -127,48 +194,86 @@ def ensure_thread(
         payload = {"createdAt": datetime.now(timezone.utc)}
         if initial_meta: 
             payload.update(initial_meta)
-        ref.set(payload)
-        return ref.id
+        await _write(None, ref, payload)
+        return ref.id, payload
 
     # 3) Mevcut varsa onu kullan, yoksa oluştur
-    existing = list(col.limit(1).stream())
+    count_round_trip()
+    existing = [d async for d in col.limit(1).stream()]
     if existing:
-        return existing[0].id
+        return existing[0].id, existing[0].to_dict() or {}
 
     ref = col.document()
-    ref.set({"createdAt": datetime.now(timezone.utc)})
-    return ref.id
-
-
-def add_message(uid: str, thread_id: str,
-                role: str, content: Any, meta: Optional[dict] = None) -> str:
-    """Thread'e mesaj ekle"""
-    doc = messages_col(uid, thread_id).document()
-    doc.set({
+    payload = {"createdAt": datetime.now(timezone.utc)}
+    await _write(None, ref, payload)
+    return ref.id, payload
+
+
+def release_thread(uid: str, thread_id: str) -> None:
+    """ensure_thread(acquire=True) ile açılan oturum cache'ini bırak"""
+    thread_cache.release(uid, thread_id)
+
+
+async def get_thread_doc(uid: str, thread_id: str) -> dict:
+    """Thread dokümanı: açık oturum varsa cache'ten, yoksa Firestore'dan"""
+    doc = thread_cache.get_doc(uid, thread_id)
+    if doc is not None:
+        return doc
+    count_round_trip()
+    snap = await thread_ref(uid, thread_id).get()
+    doc = snap.to_dict() or {}
+    thread_cache.set_doc(uid, thread_id, doc)
+    return doc
+
+
+def new_message_id(uid: str, thread_id: str) -> str:
+    """Yazmadan önce mesaj id'si üret (client-side; streaming frame'leri için)"""
+    return messages_col(uid, thread_id).document().id
+
+
+async def add_message(uid: str, thread_id: str,
+                role: str, content: Any, meta: Optional[dict] = None,
+                message_id: Optional[str] = None,
+                uow: Optional[UnitOfWork] = None) -> str:
+    """Thread'e mesaj ekle (message_id verilirse o id ile; uow verilirse commit'te yazılır)"""
+    doc = messages_col(uid, thread_id).document(message_id)
+    # Oturum penceresine de ekle: sonraki prompt geçmişi sorgusuz kurulur
+    cached = {"role": role, "content": content, "createdAt": datetime.now(timezone.utc), "meta": meta or {}}
+    await _write(uow, doc, {
         "role": role,                     # "user" | "assistant" | "systemEvent"
         "content": content,               # user/assistant: string; systemEvent: JSON
         "createdAt": firestore.SERVER_TIMESTAMP,
         "meta": meta or {},
-    })
+    }, after=lambda: thread_cache.append_message(
+        uid, thread_id, cached, len(_stringify_for_budget(cached))
+    ))
     return doc.id
 
 
-def update_thread_title(uid: str, thread_id: str, title: str) -> None:
+async def update_thread_title(uid: str, thread_id: str, title: str) -> None:
     """Thread'in title'ını güncelle"""
-    thread_ref(uid, thread_id).update({"title": title})
+    await _write(None, thread_ref(uid, thread_id), {"title": title}, update=True,
+                 after=lambda: thread_cache.apply(uid, thread_id, {"title": title}))
 
 
-def is_first_assistant_message(uid: str, thread_id: str) -> bool:
+async def is_first_assistant_message(uid: str, thread_id: str) -> bool:
     """Bu thread'de ilk assistant mesajı mı kontrol et"""
+    known = thread_cache.has_assistant(uid, thread_id)
+    if known is not None:
+        return not known
+    count_round_trip()
     messages = messages_col(uid, thread_id).where("role", "==", "assistant").limit(1).stream()
-    return len(list(messages)) == 0
+    has_assistant = len([m async for m in messages]) > 0
+    thread_cache.set_has_assistant(uid, thread_id, has_assistant)
+    return not has_assistant
 
 
-def update_last_diagnosis(uid: str, thread_id: str,
-                          cls: str, conf: float, image_ref: Optional[str] = None):
+async def update_last_diagnosis(uid: str, thread_id: str,
+                          cls: str, conf: float, image_ref: Optional[str] = None,
+                          uow: Optional[UnitOfWork] = None):
     """Thread'in son teşhis bilgisini güncelle"""
     tr = to_tr_label(cls)
-    thread_ref(uid, thread_id).set({
+    fields = {
         "lastDiagnosis": {
             "class": cls,
             "classTr": tr,
@@ -176,19 +281,43 @@ def update_last_diagnosis(uid: str, thread_id: str,
             "at": datetime.now(timezone.utc),
             "imageRef": image_ref or None
         }
-    }, merge=True)
+    }
+    await _write(uow, thread_ref(uid, thread_id), fields, merge=True,
+                 after=lambda: thread_cache.apply(uid, thread_id, fields))
+
 
+async def fetch_recent_messages(uid: str, thread_id: str, limit_n: int = 20) -> List[dict]:
+    """Thread'den son mesajları getir (açık oturum varsa pencereden)"""
+    win = thread_cache.window(uid, thread_id)
+    if win is not None and win.seeded and limit_n <= win.size:
+        thread_cache.window_hit()
+        return win.recent(limit_n)
 
-def fetch_recent_messages(uid: str, thread_id: str, limit_n: int = 20) -> List[dict]:
-    """Thread'den son mesajları getir"""
+    appends_before = win.appends if win is not None else 0
+    count_round_trip()
     q = messages_col(uid, thread_id).order_by(
         "createdAt", direction=firestore.Query.DESCENDING
     ).limit(limit_n)
-    docs = list(q.stream())
+    docs = [d async for d in q.stream()]
     items = [d.to_dict() for d in docs]
     items.reverse()
+    # Pencere boyutu kadar (veya tüm geçmiş) okunduysa pencereyi bir kez doldur
+    if win is not None and (limit_n >= win.size or len(items) < limit_n):
+        thread_cache.seed_window(
+            uid, thread_id, items, [len(_stringify_for_budget(m)) for m in items], appends_before
+        )
     return items
 
+
+async def fetch_prompt_history(uid: str, thread_id: str, limit_n: int, max_chars: int) -> List[dict]:
+    """Son limit_n mesajın karakter bütçesine sığan kısmı (= trim_history_by_chars)"""
+    win = thread_cache.window(uid, thread_id)
+    if win is not None and win.seeded and limit_n == win.size and max_chars == win.max_chars:
+        thread_cache.window_hit()
+        return win.trimmed()
+    history = await fetch_recent_messages(uid, thread_id, limit_n=limit_n)
+    return trim_history_by_chars(history, max_chars)
+
 def _stringify_for_budget(m: dict) -> str:
     r = m.get("role", "")
     c = m.get("content", "")
@@ -209,16 +338,31 @@ def trim_history_by_chars(history: List[dict], max_chars: int) -> List[dict]:
     return kept
 
 
-def get_thread_memory(uid: str, thread_id: str) -> dict:
-    snap = thread_ref(uid, thread_id).get()
-    data = snap.to_dict() or {}
+async def get_thread_memory(uid: str, thread_id: str) -> dict:
+    data = await get_thread_doc(uid, thread_id)
     return data.get("memory", {})
 
-def save_thread_memory(uid: str, thread_id: str, memory: dict):
-    thread_ref(uid, thread_id).set({"memory": memory}, merge=True)
+async def save_thread_memory(uid: str, thread_id: str, memory: dict):
+    await _write(None, thread_ref(uid, thread_id), {"memory": memory}, merge=True,
+                 after=lambda: thread_cache.apply(uid, thread_id, {"memory": memory}))
+
 
+def _history_sort_key(e: dict):
+    at = e.get("at")
+    # Firestore Timestamp -> has datetime() usually; but keep generic
+    try:
+        if hasattr(at, "datetime"):
+            return at.datetime()
+    except Exception:
+        pass
+    return at or datetime.min.replace(tzinfo=timezone.utc)
 
-def get_plant_disease_context(uid: str, plant_id: str, *, limit_n: int = 5) -> dict:
+
+def _history_dedup_key(e: dict) -> tuple:
+    return (str(_history_sort_key(e)), e.get("class"))
+
+
+async def get_plant_disease_context(uid: str, plant_id: str, *, limit_n: int = 5) -> dict:
     """Bitkinin hastalık geçmişini LLM'e göndermeye uygun şekilde getir.
 
     Dönen dict:
@@ -227,35 +371,49 @@ def get_plant_disease_context(uid: str, plant_id: str, *, limit_n: int = 5) -> d
         "lastDisease": {...} | None,
         "history": [ {...}, ... ]
       }
+
+    Geçmiş diseaseHistory alt koleksiyonundan son limit_n kayıt olarak okunur;
+    bitki dokümanından yalnızca lastDisease alanı iner. Taşınmamış (eski map'li)
+    dokümanlarda eksik kalan kısım map'ten tamamlanır.
     """
     if not plant_id:
         return {"plantId": plant_id, "lastDisease": None, "history": []}
 
-    snap = plant_ref(uid, plant_id).get()
+    ref = plant_ref(uid, plant_id)
+    q = disease_history_col(uid, plant_id).order_by(
+        "at", direction=firestore.Query.DESCENDING
+    )
+    if limit_n and limit_n > 0:
+        q = q.limit(limit_n)
+
+    async def _recent() -> List[dict]:
+        return [d.to_dict() async for d in q.stream()]
+
+    count_round_trip(2)
+    snap, entries = await asyncio.gather(
+        ref.get(field_paths=["lastDisease", "historyMigrated"]),
+        _recent(),
+    )
     if not snap.exists:
         return {"plantId": plant_id, "lastDisease": None, "history": []}
 
     data = snap.to_dict() or {}
     last_disease = data.get("lastDisease")
-    history_map = data.get("diseaseHistory") or {}
-
-    entries = []
-    if isinstance(history_map, dict):
-        for _, v in history_map.items():
-            if isinstance(v, dict):
-                entries.append(v)
-
-    def _sort_key(e: dict):
-        at = e.get("at")
-        # Firestore Timestamp -> has datetime() usually; but keep generic
-        try:
-            if hasattr(at, "datetime"):
-                return at.datetime()
-        except Exception:
-            pass
-        return at or datetime.min.replace(tzinfo=timezone.utc)
-
-    entries.sort(key=_sort_key)
+
+    # Geriye uyumluluk: migrate_disease_history.py çalışmamış dokümanlarda eski map
+    if not data.get("historyMigrated") and (not limit_n or len(entries) < limit_n):
+        count_round_trip()
+        legacy = await ref.get(field_paths=["diseaseHistory"])
+        history_map = (legacy.to_dict() or {}).get("diseaseHistory") or {}
+        if isinstance(history_map, dict):
+            # Taşıma sürerken aynı kayıt hem alt koleksiyonda hem map'te olabilir
+            seen = {_history_dedup_key(e) for e in entries}
+            for v in history_map.values():
+                if isinstance(v, dict) and _history_dedup_key(v) not in seen:
+                    seen.add(_history_dedup_key(v))
+                    entries.append(v)
+
+    entries.sort(key=_history_sort_key)
     if limit_n and limit_n > 0:
         entries = entries[-limit_n:]
 
@@ -0,0 +1,209 @@
+# thread_cache.py
+# WebSocket oturumu boyunca thread dokümanı (lastDiagnosis, memory, title) için write-through cache
+
+import copy
+import os
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Başka bir instance'ın yazdıklarını en geç bu sürede görmek için yeniden okuma aralığı
+THREAD_CACHE_TTL_S = float(os.getenv("THREAD_CACHE_TTL_S", "300"))
+# Son mesaj penceresi: prompt geçmişi (history_k) ve karakter bütçesiyle aynı olmalı
+THREAD_WINDOW_SIZE = int(os.getenv("THREAD_WINDOW_SIZE", "20"))
+HISTORY_MAX_CHARS = int(os.getenv("HISTORY_MAX_CHARS", "8000"))
+
+Key = Tuple[str, str]  # (uid, thread_id)
+
+
+class MessageWindow:
+    """
+    Son `size` mesajın ring buffer'ı + karakter bütçesine sığan son ek (suffix)
+    için artımlı sayaç. trimmed() sonucu trim_history_by_chars(recent(), max_chars)
+    ile aynıdır ama her turda baştan hesaplanmaz.
+    """
+    __slots__ = ("size", "max_chars", "items", "kept", "chars", "seeded", "seeded_at", "appends")
+
+    def __init__(self, size: int, max_chars: int):
+        self.size = size
+        self.max_chars = max_chars
+        self.items: deque = deque()   # (mesaj, bütçe uzunluğu), eskiden yeniye
+        self.kept = 0                 # bütçeye sığan son mesaj sayısı
+        self.chars = 0                # bu son mesajların toplam uzunluğu
+        self.seeded = False
+        self.seeded_at = 0.0
+        self.appends = 0              # seed sorgusu sırasında gelen yazımları tespit için
+
+    def seed(self, messages: List[dict], sizes: List[int]) -> None:
+        self.items.clear()
+        self.kept = self.chars = 0
+        for m, n in zip(messages[-self.size:], sizes[-self.size:]):
+            self._push(m, n)
+        self.seeded = True
+        self.seeded_at = time.monotonic()
+
+    def append(self, message: dict, size: int) -> None:
+        self.appends += 1
+        if self.seeded:
+            self._push(message, size)
+
+    def _push(self, message: dict, size: int) -> None:
+        if len(self.items) == self.size:
+            _, old = self.items.popleft()
+            if self.kept > len(self.items):   # atılan mesaj bütçe içindeydi
+                self.kept -= 1
+                self.chars -= old
+        self.items.append((message, size))
+        self.kept += 1
+        self.chars += size
+        # Bütçe aşıldıysa en eskiden başlayarak çıkar
+        while self.kept and self.chars > self.max_chars:
+            self.chars -= self.items[len(self.items) - self.kept][1]
+            self.kept -= 1
+
+    def recent(self, limit_n: int) -> List[dict]:
+        return [m for m, _ in list(self.items)[-limit_n:]] if limit_n > 0 else []
+
+    def trimmed(self) -> List[dict]:
+        if not self.kept:
+            return []
+        return [m for m, _ in list(self.items)[-self.kept:]]
+
+    def complete(self) -> bool:
+        """Pencere thread'in tüm geçmişini içeriyor mu (henüz size'a ulaşmadı)"""
+        return self.seeded and len(self.items) < self.size
+
+
+class ThreadState:
+    __slots__ = ("doc", "refs", "loaded_at", "window", "has_assistant")
+
+    def __init__(self):
+        self.doc: Optional[dict] = None   # thread dokümanı (None → henüz okunmadı)
+        self.refs = 0                     # bu thread'e bağlı açık oturum sayısı
+        self.loaded_at = 0.0
+        self.window = MessageWindow(THREAD_WINDOW_SIZE, HISTORY_MAX_CHARS)
+        self.has_assistant: Optional[bool] = None   # None → bilinmiyor
+
+
+class ThreadStateCache:
+    """
+    Entry'ler yalnızca acquire() ile açılan oturumlar süresince tutulur; son
+    release() ile silinir. Aynı thread'e bağlı birden çok socket entry'yi paylaşır.
+    Bizim yazımlarımız (firestore_service) apply() ile cache'e de işlenir; başka
+    process'lerin yazımları (ör. başka pod'daki analyze-image, ikinci cihaz) TTL
+    dolunca yapılan yeniden okumayla görülür. Mesaj penceresi de aynı TTL ile
+    yeniden seed edilir.
+    """
+
+    def __init__(self, ttl_s: float = THREAD_CACHE_TTL_S):
+        self.ttl_s = ttl_s
+        self._entries: Dict[Key, ThreadState] = {}
+        self._stats = {"hits": 0, "misses": 0, "writes": 0,
+                       "window_hits": 0, "window_seeds": 0, "window_expired": 0}
+
+    def acquire(self, uid: str, thread_id: str) -> ThreadState:
+        st = self._entries.get((uid, thread_id))
+        if st is None:
+            st = self._entries[(uid, thread_id)] = ThreadState()
+        st.refs += 1
+        return st
+
+    def release(self, uid: str, thread_id: str) -> None:
+        st = self._entries.get((uid, thread_id))
+        if st is None:
+            return
+        st.refs -= 1
+        if st.refs <= 0:
+            del self._entries[(uid, thread_id)]
+
+    def get_doc(self, uid: str, thread_id: str) -> Optional[dict]:
+        """Taze cache'li doküman (kopya) ya da None (okunmalı)"""
+        st = self._entries.get((uid, thread_id))
+        if st is None or st.doc is None or time.monotonic() - st.loaded_at > self.ttl_s:
+            self._stats["misses"] += 1
+            return None
+        self._stats["hits"] += 1
+        return copy.deepcopy(st.doc)
+
+    def set_doc(self, uid: str, thread_id: str, doc: dict) -> None:
+        """Firestore'dan okunan dokümanı yerleştir (açık oturum yoksa tutulmaz)"""
+        st = self._entries.get((uid, thread_id))
+        if st is None:
+            return
+        st.doc = copy.deepcopy(doc)
+        st.loaded_at = time.monotonic()
+
+    def apply(self, uid: str, thread_id: str, fields: dict) -> None:
+        """Kendi yazımımızı (set merge / update) cache'e işle"""
+        st = self._entries.get((uid, thread_id))
+        if st is None or st.doc is None:
+            return
+        st.doc.update(copy.deepcopy(fields))
+        self._stats["writes"] += 1
+
+    # ---- Mesaj penceresi ----
+    def window(self, uid: str, thread_id: str) -> Optional[MessageWindow]:
+        """Açık oturum varsa pencere (seed edilmemiş olabilir), yoksa None"""
+        st = self._entries.get((uid, thread_id))
+        return self._fresh_window(st) if st is not None else None
+
+    def _fresh_window(self, st: ThreadState) -> MessageWindow:
+        # TTL dolan pencere seed edilmemiş sayılır: sonraki okuma sorgulayıp yeniden doldurur
+        win = st.window
+        if win.seeded and time.monotonic() - win.seeded_at > self.ttl_s:
+            win.seeded = False
+            self._stats["window_expired"] += 1
+        return win
+
+    def window_hit(self) -> None:
+        self._stats["window_hits"] += 1
+
+    def seed_window(self, uid: str, thread_id: str, messages: List[dict], sizes: List[int],
+                    appends_before: int) -> None:
+        """Sorgu sonucuyla pencereyi doldur; sorgu sürerken yazım olduysa seed etme"""
+        win = self.window(uid, thread_id)
+        if win is None or win.seeded or win.appends != appends_before:
+            return
+        win.seed(messages, sizes)
+        self._stats["window_seeds"] += 1
+
+    def append_message(self, uid: str, thread_id: str, message: dict, size: int) -> None:
+        st = self._entries.get((uid, thread_id))
+        if st is None:
+            return
+        st.window.append(message, size)
+        if message.get("role") == "assistant":
+            st.has_assistant = True
+
+    def has_assistant(self, uid: str, thread_id: str) -> Optional[bool]:
+        """Thread'de assistant mesajı var mı; cache'ten bilinemiyorsa None"""
+        st = self._entries.get((uid, thread_id))
+        if st is None:
+            return None
+        if st.has_assistant:
+            return True
+        win = self._fresh_window(st)
+        if win.complete():
+            return any(m.get("role") == "assistant" for m, _ in win.items)
+        return st.has_assistant
+
+    def set_has_assistant(self, uid: str, thread_id: str, value: bool) -> None:
+        st = self._entries.get((uid, thread_id))
+        if st is not None:
+            st.has_assistant = value
+
+    def stats(self) -> dict:
+        total = self._stats["hits"] + self._stats["misses"]
+        return {
+            "threads": len(self._entries),
+            "sessions": sum(st.refs for st in self._entries.values()),
+            **self._stats,
+            "hit_rate": round(self._stats["hits"] / total, 3) if total else None,
+        }
+
+
+thread_cache = ThreadStateCache()
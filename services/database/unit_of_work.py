@@ -0,0 +1,72 @@
+# unit_of_work.py
+# Bir isteğin Firestore yazımlarını tek WriteBatch'te toplama + istek başına round-trip sayacı
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+
+# İstek boyunca yapılan round-trip sayısı (gather ile açılan task'lar da aynı listeyi görür)
+_round_trips: ContextVar[Optional[List[int]]] = ContextVar("firestore_round_trips", default=None)
+_rt_stats: Dict[str, dict] = {}
+
+
+def count_round_trip(n: int = 1) -> None:
+    """firestore_service her ağ çağrısında çağırır"""
+    counter = _round_trips.get()
+    if counter is not None:
+        counter[0] += n
+
+
+@contextmanager
+def track_round_trips(label: str):
+    """Blok içindeki Firestore round-trip'lerini say ve label altında metriğe yaz"""
+    counter = [0]
+    token = _round_trips.set(counter)
+    try:
+        yield counter
+    finally:
+        _round_trips.reset(token)
+        st = _rt_stats.setdefault(label, {"requests": 0, "total": 0, "max": 0, "last": 0})
+        st["requests"] += 1
+        st["total"] += counter[0]
+        st["max"] = max(st["max"], counter[0])
+        st["last"] = counter[0]
+
+
+def round_trip_stats() -> dict:
+    return {
+        label: {**st, "avg": round(st["total"] / st["requests"], 2) if st["requests"] else None}
+        for label, st in _rt_stats.items()
+    }
+
+
+class UnitOfWork:
+    """
+    Yazımları (set/update) biriktirip tek commit'te gönderir. Cache güncellemeleri
+    gibi yan etkiler on_commit() ile kaydedilir ve yalnızca commit başarılıysa çalışır.
+    """
+
+    def __init__(self, client):
+        self._batch = client.batch()
+        self._ops = 0
+        self._after: List[Callable[[], None]] = []
+
+    def set(self, ref, data: dict, *, merge: bool = False) -> None:
+        self._batch.set(ref, data, merge=merge)
+        self._ops += 1
+
+    def update(self, ref, data: dict) -> None:
+        self._batch.update(ref, data)
+        self._ops += 1
+
+    def on_commit(self, fn: Callable[[], None]) -> None:
+        self._after.append(fn)
+
+    async def commit(self) -> None:
+        if self._ops:
+            count_round_trip()
+            await self._batch.commit()
+        for fn in self._after:
+            fn()
+        self._ops = 0
+        self._after.clear()
@@ -0,0 +1,214 @@
+"""Değiştirilebilir inference backend'leri.
+
+`CNN_BACKEND` ortam değişkeni ile seçilir:
+- keras        → ml/models/mobilenetv2_final.keras (TensorFlow/Keras)
+- tflite       → ml/models/mobilenetv2_final.tflite (float32, XNNPACK)
+- tflite_fp16  → ml/models/mobilenetv2_final_fp16.tflite
+- tflite_int8  → ml/models/mobilenetv2_final_int8.tflite
+
+TFLite artefaktları `python scripts/convert_tflite.py` ile üretilir. TFLite
+backend'i önce hafif `tflite_runtime` paketini dener; yoksa `tf.lite`'a düşer.
+"""
+
+from __future__ import annotations
+
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+MODEL_STEM = "mobilenetv2_final"
+
+BACKEND_FILES = {
+    "keras": f"{MODEL_STEM}.keras",
+    "tflite": f"{MODEL_STEM}.tflite",
+    "tflite_fp16": f"{MODEL_STEM}_fp16.tflite",
+    "tflite_int8": f"{MODEL_STEM}_int8.tflite",
+}
+
+
+class InferenceBackend(ABC):
+    """(n, 256, 256, 3) float32[0-255] → (n, num_classes)"""
+
+    name = "base"
+
+    def __init__(self, model_path: Path):
+        self.model_path = Path(model_path)
+
+    @abstractmethod
+    def load(self) -> None:
+        ...
+
+    @abstractmethod
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        ...
+
+    def warmup(self, batch_sizes, input_shape: tuple = (256, 256, 3)) -> None:
+        """Sentetik batch'lerle graph tracing/bellek ayırmayı ilk kullanıcıdan önce yap."""
+        for n in batch_sizes:
+            self.predict(np.zeros((int(n), *input_shape), dtype=np.float32))
+
+
+class KerasBackend(InferenceBackend):
+    name = "keras"
+
+    def __init__(self, model_path: Path):
+        super().__init__(model_path)
+        self.model = None
+        self._infer = None
+
+    def load(self) -> None:
+        import tensorflow as tf        # TF sadece bu backend seçilirse import edilir
+        from tensorflow import keras
+
+        try:
+            self.model = keras.models.load_model(str(self.model_path))
+        except Exception as e:
+            hint = ""
+            msg = str(e)
+            if "keras.src.models.functional" in msg or "batch_shape" in msg:
+                hint = (
+                    "\n\nİPUCU: Bu model dosyası muhtemelen Keras 3 ile kaydedildi. "
+                    "Conda env içinde `tensorflow>=2.16` (ve beraberinde gelen Keras) kullanın "
+                    "ya da modeli TF 2.15 uyumlu formatta (SavedModel/H5) yeniden export edin."
+                )
+            raise RuntimeError(f"Model yüklenemedi ({self.model_path}): {e}{hint}")
+
+        # model.predict her çağrıda dataset/callback kurar; tek batch için doğrudan
+        # model(x, training=False) çağrısını batch boyutundan bağımsız tek bir graph'a derle.
+        model = self.model
+        spec = tf.TensorSpec([None, *model.input_shape[1:]], tf.float32)
+
+        @tf.function(input_signature=[spec])
+        def _infer(x):
+            return model(x, training=False)
+
+        self._infer = _infer
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return np.asarray(self._infer(batch), dtype=np.float32)
+
+
+def _tflite_interpreter_cls():
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class _Interp:
+    """Sabit batch boyutuna allocate edilmiş tek interpreter (+ padding buffer'ı)"""
+
+    __slots__ = ("size", "interpreter", "inp", "out", "pad", "lock")
+
+    def __init__(self, interpreter, size: int):
+        inp = interpreter.get_input_details()[0]
+        if size != int(inp["shape"][0]):
+            interpreter.resize_tensor_input(inp["index"], [size, *inp["shape"][1:]])
+        interpreter.allocate_tensors()
+        self.size = size
+        self.interpreter = interpreter
+        self.inp = interpreter.get_input_details()[0]
+        self.out = interpreter.get_output_details()[0]
+        self.pad: Optional[np.ndarray] = None   # size'tan küçük batch'ler için sıfır dolgulu giriş
+        self.lock = threading.Lock()            # interpreter thread-safe değil
+
+
+class TFLiteBackend(InferenceBackend):
+    """
+    TFLite interpreter (float modellerde XNNPACK delegate varsayılan olarak devrede).
+
+    resize_tensor_input + allocate_tensors her batch boyutu değişiminde tensörleri
+    yeniden ayırır; karışık boyutlu batch'lerde bu neredeyse her çağrıda olur. Bu
+    yüzden warm-up'taki her boyut için ayrı, sabit boyutlu bir interpreter tutulur;
+    n satırlık batch en küçük uygun (>= n) interpreter'a sıfır dolgusuyla verilir.
+    Warm-up'ta olmayan daha büyük bir boyut gelirse onun için bir kez oluşturulur.
+    """
+
+    def __init__(self, model_path: Path, *, num_threads: Optional[int] = None, name: str = "tflite"):
+        super().__init__(model_path)
+        self.name = name
+        self.num_threads = num_threads
+        self._interps: dict = {}        # batch boyutu → _Interp
+        self._sizes: list = []          # sıralı
+        self._lock = threading.Lock()   # _interps oluşturma
+
+    def load(self) -> None:
+        if not self.model_path.exists():
+            raise RuntimeError(
+                f"TFLite modeli bulunamadı ({self.model_path}). "
+                "Önce `python scripts/convert_tflite.py` çalıştırın."
+            )
+        self._Interpreter = _tflite_interpreter_cls()
+        self._interps, self._sizes = {}, []
+        self._get(1)
+
+    def _get(self, size: int) -> _Interp:
+        with self._lock:
+            it = self._interps.get(size)
+            if it is None:
+                it = _Interp(self._Interpreter(model_path=str(self.model_path), num_threads=self.num_threads), size)
+                self._interps[size] = it
+                self._sizes = sorted(self._interps)
+            return it
+
+    def _pick(self, n: int) -> _Interp:
+        for size in self._sizes:
+            if size >= n:
+                return self._interps[size]
+        return self._get(n)
+
+    def warmup(self, batch_sizes, input_shape: tuple = (256, 256, 3)) -> None:
+        # Her boyut kendi interpreter'ını alır; sonraki çağrılarda yeniden allocate yok
+        for n in batch_sizes:
+            self._get(int(n))
+        super().warmup(batch_sizes, input_shape)
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        n = int(batch.shape[0])
+        it = self._pick(n)
+        with it.lock:
+            if n < it.size:
+                if it.pad is None:
+                    it.pad = np.zeros((it.size, *batch.shape[1:]), dtype=np.float32)
+                it.pad[:n] = batch
+                it.pad[n:] = 0.0
+                batch = it.pad
+
+            x = _quantize(batch, it.inp)
+            it.interpreter.set_tensor(it.inp["index"], x)
+            it.interpreter.invoke()
+            out = it.interpreter.get_tensor(it.out["index"])
+            return _dequantize(out[:n], it.out)
+
+
+def _quantize(x: np.ndarray, detail: dict) -> np.ndarray:
+    dtype = detail["dtype"]
+    scale, zero_point = detail.get("quantization", (0.0, 0))
+    if np.issubdtype(dtype, np.integer) and scale:
+        info = np.iinfo(dtype)
+        return np.clip(np.round(x / scale + zero_point), info.min, info.max).astype(dtype)
+    return x.astype(dtype, copy=False)
+
+
+def _dequantize(y: np.ndarray, detail: dict) -> np.ndarray:
+    scale, zero_point = detail.get("quantization", (0.0, 0))
+    if np.issubdtype(y.dtype, np.integer) and scale:
+        return (y.astype(np.float32) - zero_point) * scale
+    return np.asarray(y, dtype=np.float32)
+
+
+def create_backend(kind: str, models_dir: Path, *, num_threads: Optional[int] = None) -> InferenceBackend:
+    """Ortam değişkenindeki isme göre backend nesnesi oluştur (henüz yüklemez)."""
+    kind = (kind or "keras").strip().lower()
+    if kind not in BACKEND_FILES:
+        raise RuntimeError(f"Bilinmeyen CNN_BACKEND: {kind} (seçenekler: {', '.join(BACKEND_FILES)})")
+
+    path = Path(models_dir) / BACKEND_FILES[kind]
+    if kind == "keras":
+        return KerasBackend(path)
+    return TFLiteBackend(path, num_threads=num_threads, name=kind)
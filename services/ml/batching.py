@@ -0,0 +1,177 @@
+"""Dinamik mikro-batch inference motoru.
+
+Eşzamanlı gelen tekil görüntü istekleri bir kuyrukta toplanır. Tek bir worker
+thread en fazla `max_batch_size` satır birikene ya da `max_wait_ms` dolana kadar
+bekler, tek bir batched forward pass çalıştırır ve her çağırana kendi satırını
+(Future üzerinden) döndürür.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+import numpy as np
+
+
+class _Job:
+    __slots__ = ("x", "future", "enqueued_at")
+
+    def __init__(self, x: np.ndarray, future: Future):
+        self.x = x                      # (n, H, W, C)
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+    @property
+    def rows(self) -> int:
+        return int(self.x.shape[0])
+
+
+class MicroBatcher:
+    """Kuyruk + worker thread ile batch toplayan inference motoru."""
+
+    def __init__(
+        self,
+        predict_fn: Callable[[np.ndarray], np.ndarray],
+        *,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+        name: str = "cnn",
+    ):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_ms = max(0.0, float(max_wait_ms))
+        self.name = name
+
+        self._queue: "queue.Queue[_Job]" = queue.Queue()
+        self._carry: Optional[_Job] = None   # bir önceki batch'e sığmayan iş
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+        # ── Metrikler
+        self._stats_lock = threading.Lock()
+        self._hist: Counter = Counter()
+        self._requests = 0
+        self._batches = 0
+        self._wait_ms = deque(maxlen=1024)      # kuyrukta bekleme süreleri
+        self._forward_ms = deque(maxlen=1024)   # batch forward süreleri
+
+    # -------------------- Public API --------------------
+    def submit(self, x: np.ndarray) -> Future:
+        """(H, W, C) ya da (n, H, W, C) tensörü kuyruğa koy; (n, num_classes) döndüren Future verir."""
+        if x.ndim == 3:
+            x = x[None, ...]
+        fut: Future = Future()
+        self._ensure_worker()
+        self._queue.put(_Job(x, fut))
+        return fut
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        """Senkron çağıranlar için: sonucu bekle ve döndür."""
+        return self.submit(x).result()
+
+    async def predict_async(self, x: np.ndarray) -> np.ndarray:
+        """Async çağıranlar için: event loop'u bloklamadan bekle."""
+        return await asyncio.wrap_future(self.submit(x))
+
+    def stats(self) -> dict:
+        """Batch boyutu histogramı ve bekleme/forward süre yüzdelikleri."""
+        with self._stats_lock:
+            hist = dict(sorted(self._hist.items()))
+            requests, batches = self._requests, self._batches
+            wait_ms = sorted(self._wait_ms)
+            forward_ms = sorted(self._forward_ms)
+
+        return {
+            "name": self.name,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "queue_depth": self._queue.qsize(),
+            "requests": requests,
+            "batches": batches,
+            "avg_batch_size": round(sum(k * v for k, v in hist.items()) / batches, 3) if batches else 0.0,
+            "batch_size_histogram": {str(k): v for k, v in hist.items()},
+            "queue_wait_ms": _percentiles(wait_ms),
+            "forward_ms": _percentiles(forward_ms),
+        }
+
+    # -------------------- Worker --------------------
+    def _ensure_worker(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                t = threading.Thread(target=self._run, name=f"{self.name}-batcher", daemon=True)
+                t.start()
+                self._thread = t
+
+    def _collect(self) -> list:
+        """İlk işi bloklayarak al, sonra süre/boyut limitine kadar doldur."""
+        first = self._carry if self._carry is not None else self._queue.get()
+        self._carry = None
+
+        jobs = [first]
+        rows = first.rows
+        deadline = time.perf_counter() + self.max_wait_ms / 1000.0
+        while rows < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if rows + job.rows > self.max_batch_size:
+                # Sığmıyorsa bir sonraki batch'in ilk işi olsun
+                self._carry = job
+                break
+            jobs.append(job)
+            rows += job.rows
+        return jobs
+
+    def _run(self) -> None:
+        while True:
+            jobs = self._collect()
+            # İptal edilmiş (ör. client koptu) işleri at
+            jobs = [j for j in jobs if j.future.set_running_or_notify_cancel()]
+            if not jobs:
+                continue
+
+            now = time.perf_counter()
+            batch = jobs[0].x if len(jobs) == 1 else np.concatenate([j.x for j in jobs], axis=0)
+
+            try:
+                t0 = time.perf_counter()
+                out = np.asarray(self.predict_fn(batch))
+                forward_ms = (time.perf_counter() - t0) * 1000
+            except BaseException as e:  # noqa: BLE001 - hatayı tüm bekleyenlere ilet
+                for j in jobs:
+                    j.future.set_exception(e)
+                continue
+
+            offset = 0
+            for j in jobs:
+                j.future.set_result(out[offset:offset + j.rows])
+                offset += j.rows
+
+            with self._stats_lock:
+                self._hist[int(batch.shape[0])] += 1
+                self._batches += 1
+                self._requests += len(jobs)
+                self._forward_ms.append(forward_ms)
+                for j in jobs:
+                    self._wait_ms.append((now - j.enqueued_at) * 1000)
+
+
+def _percentiles(sorted_vals: list) -> dict:
+    if not sorted_vals:
+        return {"p50": 0.0, "p90": 0.0, "p99": 0.0}
+
+    def pick(q: float) -> float:
+        idx = min(len(sorted_vals) - 1, int(round(q * (len(sorted_vals) - 1))))
+        return round(float(sorted_vals[idx]), 3)
+
+    return {"p50": pick(0.50), "p90": pick(0.90), "p99": pick(0.99)}
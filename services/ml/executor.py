@@ -0,0 +1,72 @@
+"""Inference için ayrılmış, sınırlı kapasiteli executor.
+
+Görüntü decode/resize ve model çağrıları event loop dışında, kendi thread
+havuzunda çalışır. Aynı anda kabul edilen istek sayısı `max_pending` ile
+sınırlıdır; dolduğunda `InferenceBusyError` fırlatılır (router'lar 503 +
+Retry-After döner), böylece bir upload patlaması chat trafiğini dondurmaz.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Callable
+
+
+class InferenceBusyError(RuntimeError):
+    """Inference kuyruğu dolu; `retry_after` saniye sonra tekrar denenmeli."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Inference kuyruğu dolu")
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    """Bounded thread pool + kuyruk derinliği limiti"""
+
+    def __init__(self, *, max_workers: int = 2, max_pending: int = 32,
+                 retry_after_s: int = 1, name: str = "inference"):
+        self.max_workers = max(1, int(max_workers))
+        self.max_pending = max(1, int(max_pending))
+        self.retry_after_s = max(1, int(retry_after_s))
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+
+        # Sayaçlar sadece event loop thread'inden değişir, kilit gerekmez
+        self._pending = 0
+        self._accepted = 0
+        self._rejected = 0
+
+    @asynccontextmanager
+    async def slot(self, weight: int = 1):
+        """Bir istek için `weight` görüntülük kapasite ayır; doluysa hemen reddet.
+
+        Kuyruk boşken limitten büyük tek bir istek yine de kabul edilir.
+        """
+        if self._pending and self._pending + weight > self.max_pending:
+            self._rejected += 1
+            raise InferenceBusyError(self.retry_after_s)
+        self._pending += weight
+        self._accepted += 1
+        try:
+            yield
+        finally:
+            self._pending -= weight
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """fn'i havuzda çalıştır ve sonucu bekle."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, functools.partial(fn, *args, **kwargs))
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "pending": self._pending,
+            "accepted": self._accepted,
+            "rejected": self._rejected,
+        }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
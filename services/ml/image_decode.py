@@ -0,0 +1,66 @@
+"""Hızlı görüntü decode hattı (upload bytes → model tensörü).
+
+- Header okunur okunmaz piksel sayısı kontrol edilir (decompression bomb koruması)
+- JPEG'ler draft modunda DCT ölçekleme ile 1/2, 1/4, 1/8 boyutunda decode edilir;
+  12MP bir telefon fotoğrafının atılacak pikselleri hiç açılmaz
+- EXIF yönlendirmesi uygulanır (telefonlar dikey fotoğrafı döndürülmüş kaydeder)
+- Diğer formatlarda `reducing_gap` ile önce hızlı tamsayı küçültme yapılır
+- Sonuç doğrudan verilen (ya da yeni ayrılan) float32 buffer'a yazılır
+"""
+
+from __future__ import annotations
+
+import io
+import os
+from typing import Optional
+
+import numpy as np
+from PIL import Image, ImageOps
+
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(40_000_000)))   # ~40MP
+
+_EXIF_ORIENTATION = 0x0112
+
+
+class ImageTooLargeError(ValueError):
+    """Görüntünün piksel sayısı izin verilen sınırı aşıyor."""
+
+
+def decode_to_tensor(
+    image_bytes: bytes,
+    size: tuple[int, int] = (256, 256),
+    *,
+    out: Optional[np.ndarray] = None,
+    max_pixels: int = MAX_IMAGE_PIXELS,
+) -> np.ndarray:
+    """Görüntü bytes'ı → (1, H, W, 3) float32[0-255]
+
+    `out` verilirse (1, H, W, 3) float32 buffer'a yazılır ve o döndürülür.
+    """
+    if not image_bytes:
+        raise ValueError("Boş görüntü")
+
+    try:
+        img = Image.open(io.BytesIO(image_bytes))   # lazy: sadece header okunur
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(str(e)) from e
+
+    w, h = img.size
+    if w * h > max_pixels:
+        raise ImageTooLargeError(f"Görüntü çok büyük: {w}x{h} piksel (sınır {max_pixels})")
+
+    if img.format == "JPEG":
+        # Hedef boyuttan küçük olmayan en küçük DCT ölçeğini seç
+        img.draft("RGB", size)
+
+    # exif_transpose yönlendirme yoksa tam boyutlu kopya üretir; sadece gerekince çağır
+    if img.getexif().get(_EXIF_ORIENTATION, 1) != 1:
+        img = ImageOps.exif_transpose(img)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    img = img.resize(size, Image.BICUBIC, reducing_gap=3.0)
+
+    if out is None:
+        out = np.empty((1, size[1], size[0], 3), dtype=np.float32)
+    np.copyto(out[0], np.asarray(img), casting="unsafe")   # uint8 → float32, ara kopya yok
+    return out
@@ -0,0 +1,178 @@
+"""İçerik adresli tahmin cache'i.
+
+Aynı yaprak fotoğrafı (retry'lar, önce /predict sonra /chat/analyze-image)
+tekrar yüklendiğinde forward pass'i atlamak için (cls, conf, probs) sonuçlarını
+saklar:
+
+- 1. seviye: ham bytes'ın blake2b hash'i (birebir aynı dosya)
+- 2. seviye (opsiyonel): 256x256 ön işlenmiş tensörün perceptual hash'i
+  (yeniden encode edilmiş kopyalar). Farklı görüntülerin çakışma ihtimali
+  sıfır olmadığı için varsayılan kapalıdır.
+
+LRU + TTL ile sınırlıdır. Sonuçlar yüklü modele aittir: backend yeni bir model
+yüklediğinde (set_model, imza = dosyanın mtime/boyutu) cache tamamen boşaltılır.
+Diskteki dosyanın değişmesi tek başına bir şey ifade etmez; bellekteki model aynı kalır.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+Prediction = tuple  # (cls: str, conf: float, probs: list[float])
+
+_GRAY = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+class _LRU:
+    """TTL'li, boyut sınırlı OrderedDict LRU (kilit dışarıda tutulur)."""
+
+    def __init__(self, max_entries: int, ttl_s: float):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.data: "OrderedDict[str, tuple[float, Prediction]]" = OrderedDict()
+        self.evictions = 0
+
+    def get(self, key: str, now: float) -> Optional[Prediction]:
+        item = self.data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at <= now:
+            del self.data[key]
+            return None
+        self.data.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: Prediction, now: float) -> None:
+        self.data[key] = (now + self.ttl_s, value)
+        self.data.move_to_end(key)
+        while len(self.data) > self.max_entries:
+            self.data.popitem(last=False)
+            self.evictions += 1
+
+
+class PredictionCache:
+    """Bytes hash'i (+ opsiyonel perceptual hash) → (cls, conf, probs)"""
+
+    def __init__(self, *, max_entries: int = 1024, ttl_s: float = 3600.0,
+                 perceptual: bool = False):
+        self.enabled = max_entries > 0
+        self.perceptual = perceptual
+
+        self._lock = threading.Lock()
+        self._exact = _LRU(max_entries, ttl_s)
+        self._phash = _LRU(max_entries, ttl_s)
+        self._model_sig: Optional[tuple] = None
+
+        self.hits = 0
+        self.perceptual_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    # -------------------- Anahtarlar --------------------
+    @staticmethod
+    def content_key(image_bytes: bytes) -> str:
+        return hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
+
+    @staticmethod
+    def perceptual_key(x: np.ndarray) -> str:
+        """(1, 256, 256, 3) tensör → 64 bit average hash (hex)"""
+        img = x[0] if x.ndim == 4 else x
+        gray = img @ _GRAY                                  # (256, 256)
+        h, w = gray.shape
+        blocks = gray[: h - h % 8, : w - w % 8].reshape(8, h // 8, 8, w // 8).mean(axis=(1, 3))
+        bits = (blocks > blocks.mean()).ravel()
+        return f"{int(np.packbits(bits).view('>u8')[0]):016x}"
+
+    # -------------------- Lookup / Store --------------------
+    def get(self, key: str) -> Optional[Prediction]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            value = self._exact.get(key, time.monotonic())
+            if value is not None:
+                self.hits += 1
+            return _copy(value)
+
+    def get_perceptual(self, pkey: str) -> Optional[Prediction]:
+        """İkinci seviye: perceptual hash ile ara. get() ile birlikte tek miss sayılır."""
+        if not (self.enabled and self.perceptual):
+            return None
+        with self._lock:
+            value = self._phash.get(pkey, time.monotonic())
+            if value is not None:
+                self.perceptual_hits += 1
+            return _copy(value)
+
+    def record_miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    def put(self, key: str, value: Prediction, pkey: Optional[str] = None) -> None:
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._exact.put(key, value, now)
+            if pkey and self.perceptual:
+                self._phash.put(pkey, value, now)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._exact.data.clear()
+            self._phash.data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.perceptual_hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "perceptual": self.perceptual,
+                "entries": len(self._exact.data),
+                "perceptual_entries": len(self._phash.data),
+                "max_entries": self._exact.max_entries,
+                "ttl_s": self._exact.ttl_s,
+                "hits": self.hits,
+                "perceptual_hits": self.perceptual_hits,
+                "misses": self.misses,
+                "hit_ratio": round((self.hits + self.perceptual_hits) / lookups, 4) if lookups else 0.0,
+                "evictions": self._exact.evictions + self._phash.evictions,
+                "invalidations": self.invalidations,
+                "model_signature": self._model_sig,
+            }
+
+    # -------------------- Model değişikliği --------------------
+    def set_model(self, signature: Optional[tuple]) -> None:
+        """Backend bir model yükledikten sonra çağrılır; önceki modelin sonuçlarını at."""
+        with self._lock:
+            if signature == self._model_sig:
+                return
+            self._model_sig = signature
+            if self._exact.data or self._phash.data:
+                self._exact.data.clear()
+                self._phash.data.clear()
+                self.invalidations += 1
+
+
+def model_signature(path: Path) -> Optional[tuple]:
+    """Model dosyasının (mtime_ns, boyut) imzası; okunamazsa None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _copy(value: Optional[Prediction]) -> Optional[Prediction]:
+    if value is None:
+        return None
+    cls, conf, probs = value
+    return cls, conf, list(probs)
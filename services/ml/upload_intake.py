@@ -0,0 +1,225 @@
+"""Görüntü upload'ları için akış (streaming) tabanlı giriş katmanı.
+
+İki kademe:
+1) `UploadSizeLimitMiddleware` (ASGI): Content-Length sınırı aşan istekleri gövde
+   okunmadan 413 ile reddeder; Content-Length yoksa gövdeyi sayarak okur ve
+   sınır aşıldığı anda keser. Multipart parse'tan önce çalışır.
+2) `read_image_upload`: UploadFile'ı parça parça okur, ilk kilobaytlardan magic
+   bytes ve header boyutlarını koklar; desteklenmeyen formatı 415, aşırı
+   boyutu 413 ile hemen reddeder ve decoder'a sınırlı bir buffer verir.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Mapping, Optional
+
+from fastapi import HTTPException, UploadFile
+
+from services.ml.image_decode import MAX_IMAGE_PIXELS
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))   # 10MB
+
+SNIFF_BYTES = 64 * 1024        # JPEG'de SOF, EXIF/APP segmentlerinden sonra gelebilir
+CHUNK_BYTES = 64 * 1024
+MULTIPART_OVERHEAD = 64 * 1024  # form alanları + boundary payı
+
+# /predict/batch: tek istekte en fazla dosya sayısı
+PREDICT_BATCH_MAX_FILES = int(os.getenv("PREDICT_BATCH_MAX_FILES", "8"))
+
+
+def upload_body_limits() -> dict:
+    """UploadSizeLimitMiddleware için path → gövde sınırı"""
+    single = MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD
+    return {
+        "/predict": single,
+        "/chat/analyze-image": single,
+        "/predict/batch": PREDICT_BATCH_MAX_FILES * MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD,
+    }
+
+ImageHeader = tuple  # (format: str, width: Optional[int], height: Optional[int])
+
+# sniff_image_header'ın tanıdığı formatlar (415 mesajı buradan üretilir)
+SUPPORTED_FORMATS = ("JPEG", "PNG", "WebP", "GIF", "BMP")
+
+# SOF0..SOF15 (DHT=C4, JPG=C8, DAC=CC hariç)
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+# -------------------- Header sniffing --------------------
+def sniff_image_header(head: bytes) -> Optional[ImageHeader]:
+    """İlk baytlardan (format, genişlik, yükseklik). Tanınmayan formatta None.
+
+    Boyutlar header'da bulunamazsa (ör. JPEG SOF pencere dışında) None olur;
+    o durumda decoder'daki piksel koruması devreye girer.
+    """
+    if head[:3] == b"\xff\xd8\xff":
+        return ("JPEG", *_jpeg_size(head))
+    if head[:8] == b"\x89PNG\r\n\x1a\n":
+        if len(head) >= 24 and head[12:16] == b"IHDR":
+            return "PNG", int.from_bytes(head[16:20], "big"), int.from_bytes(head[20:24], "big")
+        return "PNG", None, None
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ("WEBP", *_webp_size(head))
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        if len(head) >= 10:
+            return "GIF", int.from_bytes(head[6:8], "little"), int.from_bytes(head[8:10], "little")
+        return "GIF", None, None
+    if head[:2] == b"BM":
+        if len(head) >= 26 and int.from_bytes(head[14:18], "little") >= 40:
+            w = int.from_bytes(head[18:22], "little", signed=True)
+            h = int.from_bytes(head[22:26], "little", signed=True)
+            return "BMP", abs(w), abs(h)
+        return "BMP", None, None
+    return None
+
+
+def _jpeg_size(head: bytes) -> tuple[Optional[int], Optional[int]]:
+    i, n = 2, len(head)
+    while i + 9 < n:
+        if head[i] != 0xFF:
+            return None, None
+        marker = head[i + 1]
+        if marker == 0xFF:              # dolgu baytı
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:   # uzunluksuz marker'lar
+            i += 2
+            continue
+        if marker in _JPEG_SOF:
+            h = int.from_bytes(head[i + 5:i + 7], "big")
+            w = int.from_bytes(head[i + 7:i + 9], "big")
+            return w, h
+        i += 2 + int.from_bytes(head[i + 2:i + 4], "big")
+    return None, None
+
+
+def _webp_size(head: bytes) -> tuple[Optional[int], Optional[int]]:
+    if len(head) < 30:
+        return None, None
+    chunk = head[12:16]
+    if chunk == b"VP8X":
+        return 1 + int.from_bytes(head[24:27], "little"), 1 + int.from_bytes(head[27:30], "little")
+    if chunk == b"VP8L" and head[20] == 0x2F:
+        bits = int.from_bytes(head[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8 " and head[23:26] == b"\x9d\x01\x2a":
+        return int.from_bytes(head[26:28], "little") & 0x3FFF, int.from_bytes(head[28:30], "little") & 0x3FFF
+    return None, None
+
+
+# -------------------- UploadFile okuma --------------------
+async def read_image_upload(
+    file: UploadFile,
+    *,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    max_pixels: int = MAX_IMAGE_PIXELS,
+) -> bytearray:
+    """UploadFile'ı parça parça oku; format/boyut kontrolü başta, toplam boyut akış boyunca.
+
+    Hatalar: 400 (boş), 413 (çok büyük), 415 (görüntü değil / desteklenmiyor)
+    """
+    buf = bytearray()
+
+    # 1) Header'ı koklamaya yetecek kadar oku
+    while len(buf) < SNIFF_BYTES:
+        chunk = await file.read(CHUNK_BYTES)
+        if not chunk:
+            break
+        buf += chunk
+        if len(buf) > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Dosya çok büyük (sınır {max_bytes} bayt)")
+
+    if not buf:
+        raise HTTPException(status_code=400, detail="Boş dosya")
+
+    header = sniff_image_header(bytes(buf[:SNIFF_BYTES]))
+    if header is None:
+        raise HTTPException(status_code=415, detail=f"Desteklenmeyen dosya türü ({'/'.join(SUPPORTED_FORMATS)} bekleniyor)")
+    _, w, h = header
+    if w is not None and h is not None and w * h > max_pixels:
+        raise HTTPException(status_code=413, detail=f"Görüntü çok büyük: {w}x{h} piksel (sınır {max_pixels})")
+
+    # 2) Kalanı sınır kontrolüyle oku
+    while True:
+        chunk = await file.read(CHUNK_BYTES)
+        if not chunk:
+            break
+        if len(buf) + len(chunk) > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Dosya çok büyük (sınır {max_bytes} bayt)")
+        buf += chunk
+
+    return buf
+
+
+# -------------------- ASGI gövde limiti --------------------
+class _BodyTooLarge(Exception):
+    pass
+
+
+class UploadSizeLimitMiddleware:
+    """Belirli path'lerde istek gövdesini multipart parse'tan önce sınırla.
+
+    `limits`: {path: max_body_bytes}; listede olmayan path'lere dokunulmaz.
+    """
+
+    def __init__(self, app, *, limits: Mapping[str, int]):
+        self.app = app
+        self.limits = dict(limits)
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                try:
+                    too_big = int(value) > limit
+                except ValueError:
+                    too_big = False
+                if too_big:
+                    await self._reject(send, limit)
+                    return
+                break
+
+        # Content-Length yok/yanlış olabilir: gövdeyi sayarak ilet
+        received = 0
+        exceeded = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    exceeded = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def guarded_send(message):
+            # Sınır aşıldıysa uygulamanın (ör. 400 parse hatası) cevabını yut
+            if not exceeded:
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except _BodyTooLarge:
+            pass
+        if exceeded:
+            await self._reject(send, limit)
+
+    @staticmethod
+    async def _reject(send, limit: int) -> None:
+        body = ('{"detail":"İstek gövdesi çok büyük (sınır %d bayt)"}' % limit).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -1,11 +1,24 @@
 # predictService.py - Model ve helper fonksiyonları
-import io
+import asyncio
 import json
+import os
+import threading
+import time
 from pathlib import Path
+from typing import Optional
 
 import numpy as np
-from tensorflow import keras
 from PIL import Image
+from dotenv import load_dotenv
+
+from services.ml.backends import create_backend
+from services.ml.batching import MicroBatcher
+from services.ml.image_decode import decode_to_tensor
+from services.ml.executor import InferenceExecutor
+from services.ml.prediction_cache import PredictionCache, model_signature
+
+# .env'yi erken yükle (aşağıdaki env read'leri import anında yapılıyor)
+load_dotenv()
 
 
 def _repo_root() -> Path:
@@ -14,25 +27,26 @@ def _repo_root() -> Path:
 
 
 # ── MODEL + CLASSES yükle
-# Yeni inference modeli
-MODEL_PATH = _repo_root() / "ml" / "models" / "mobilenetv2_final.keras"
+MODELS_DIR = _repo_root() / "ml" / "models"
+
+# Inference backend'i: keras | tflite | tflite_fp16 | tflite_int8
+CNN_BACKEND = os.getenv("CNN_BACKEND", "keras")
+CNN_TFLITE_THREADS = int(os.getenv("CNN_TFLITE_THREADS", "0")) or None
+
+# Chat-only deployment'larda modeli hiç yükleme
+CNN_ENABLED = os.getenv("CNN_ENABLED", "1") == "1"
+# 1 → startup'ta arka planda yükle; 0 → ilk tahmin isteğinde (lazy) yükle
+CNN_PRELOAD = os.getenv("CNN_PRELOAD", "1") == "1"
+
+# Backend burada sadece oluşturulur; yükleme ensure_model_loaded() ile yapılır
+backend = create_backend(CNN_BACKEND, MODELS_DIR, num_threads=CNN_TFLITE_THREADS)
+
+# Yeni inference modeli (aktif backend'in artefaktı)
+MODEL_PATH = backend.model_path
 
 # Model class listesi (model output index -> label)
 CLASSES_PATH = _repo_root() / "ml" / "classes" / "classes.json"
 
-try:
-    model = keras.models.load_model(str(MODEL_PATH))
-except Exception as e:
-    hint = ""
-    msg = str(e)
-    if "keras.src.models.functional" in msg or "batch_shape" in msg:
-        hint = (
-            "\n\nİPUCU: Bu model dosyası muhtemelen Keras 3 ile kaydedildi. "
-            "Conda env içinde `tensorflow>=2.16` (ve beraberinde gelen Keras) kullanın "
-            "ya da modeli TF 2.15 uyumlu formatta (SavedModel/H5) yeniden export edin."
-        )
-    raise RuntimeError(f"Model yüklenemedi ({MODEL_PATH}): {e}{hint}")
-
 try:
     CLASSES = json.loads(CLASSES_PATH.read_text(encoding="utf-8"))
     if not isinstance(CLASSES, list) or not all(isinstance(x, str) for x in CLASSES):
@@ -44,6 +58,81 @@ except Exception as e:
 IMG_SIZE = (256, 256)
 
 
+# ── Model yükleme durumu (lazy / arka plan)
+class ModelUnavailableError(RuntimeError):
+    """Model devre dışı ya da yüklenemedi."""
+
+
+_load_lock = threading.Lock()
+_model_ready = threading.Event()
+_load_error: Optional[str] = None
+_warmup: dict = {"ms": None}
+
+
+def ensure_model_loaded() -> None:
+    """Backend'i bir kez yükle ve ısıt. Başarısız olursa sonraki çağrıda tekrar denenir.
+
+    Readiness (preload modunda) ancak warm-up bittikten sonra true olur. Yükleme
+    hatası ModelUnavailableError olarak fırlar: lazy modda ilk batch'in istekleri
+    500 değil 503 alır.
+    """
+    global _load_error
+    if _model_ready.is_set():
+        return
+    if not CNN_ENABLED:
+        raise ModelUnavailableError("CNN devre dışı (CNN_ENABLED=0)")
+
+    with _load_lock:
+        if _model_ready.is_set():
+            return
+        try:
+            sig = model_signature(MODEL_PATH)     # yüklenen dosyanın imzası (load'dan önce)
+            backend.load()
+            prediction_cache.set_model(sig)
+            t0 = time.perf_counter()
+            backend.warmup(CNN_WARMUP_BATCH_SIZES, (*IMG_SIZE[::-1], 3))
+            _warmup["ms"] = int((time.perf_counter() - t0) * 1000)
+        except Exception as e:
+            _load_error = str(e)
+            raise ModelUnavailableError(f"Model yüklenemedi: {e}") from e
+        _load_error = None
+        _model_ready.set()
+
+
+def start_background_model_load() -> None:
+    """Startup'ta modeli ayrı bir thread'de yükle; /ping beklemeden cevap verir."""
+    if not (CNN_ENABLED and CNN_PRELOAD) or _model_ready.is_set():
+        return
+
+    def _load():
+        try:
+            ensure_model_loaded()
+        except Exception as e:
+            print(f"Model arka planda yüklenemedi: {e}")
+
+    threading.Thread(target=_load, name="model-loader", daemon=True).start()
+
+
+def model_status() -> dict:
+    """Readiness bilgisi: CNN kapalıysa yüklenecek model olmadığından hazır sayılır.
+
+    Lazy modda (CNN_PRELOAD=0) model ilk tahminde yüklenir; trafik gelmeden
+    yüklenmeyeceği için pod hazır sayılır (aksi halde readiness-gated LB hiç
+    trafik göndermez). Yükleme hatası "error" alanında görünür.
+    """
+    loaded = _model_ready.is_set()
+    return {
+        "cnn_enabled": CNN_ENABLED,
+        "backend": backend.name,
+        "preload": CNN_PRELOAD,
+        "model_loaded": loaded,
+        "ready": loaded or not CNN_ENABLED or not CNN_PRELOAD,
+        "error": _load_error,
+        "warmup_batch_sizes": CNN_WARMUP_BATCH_SIZES,
+        "warmup_ms": _warmup["ms"],
+    }
+
+
 def preprocess(img: Image.Image) -> np.ndarray:
     """Decode edilmiş PIL image → RGB → 256x256 → float32[0-255] → (1, 256, 256, 3)"""
     img = img.convert("RGB").resize(IMG_SIZE)
@@ -57,15 +146,19 @@ def _softmax_logits(arr: np.ndarray) -> np.ndarray:
     return e / np.sum(e)
 
 
-def run_cnn_prediction(image_bytes: bytes) -> tuple[str, float, list[float]]:
-    """Görüntü bytes'ı → (class_label, confidence, probs[])"""
-    if not image_bytes:
-        raise ValueError("Boş görüntü")
+def decode_image(image_bytes: bytes, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Görüntü bytes'ı → (1, 256, 256, 3) float32 tensör (JPEG draft decode + EXIF yönlendirme)"""
+    return decode_to_tensor(image_bytes, IMG_SIZE, out=out)
+
 
-    img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-    x = preprocess(img)  # (1, 256, 256, 3) float32
+def _forward(batch: np.ndarray) -> np.ndarray:
+    """(n, 256, 256, 3) → (n, num_classes) olasılıklar"""
+    ensure_model_loaded()   # lazy modda ilk batch modeli yükler
+    return backend.predict(batch)
 
-    probs = model.predict(x, verbose=0)[0]
+
+def _postprocess(probs: np.ndarray) -> tuple[str, float, list[float]]:
+    """Tek satırlık model çıktısı → (class_label, confidence, probs[])"""
     if not isinstance(probs, np.ndarray):
         probs = np.array(probs, dtype=np.float32)
 
@@ -77,4 +170,205 @@ def run_cnn_prediction(image_bytes: bytes) -> tuple[str, float, list[float]]:
     cls = CLASSES[idx]
     conf = float(probs[idx])
 
-    return cls, conf, [float(p) for p in probs]
\ No newline at end of file
+    return cls, conf, [float(p) for p in probs]
+
+
+# ── Mikro-batch motoru: eşzamanlı istekler tek forward pass'te birleşir
+CNN_MAX_BATCH_SIZE = int(os.getenv("CNN_MAX_BATCH_SIZE", "8"))
+CNN_MAX_WAIT_MS = float(os.getenv("CNN_MAX_WAIT_MS", "5"))
+
+batcher = MicroBatcher(_forward, max_batch_size=CNN_MAX_BATCH_SIZE, max_wait_ms=CNN_MAX_WAIT_MS)
+
+
+def _default_warmup_sizes(max_batch: int) -> list[int]:
+    """1, 2, 4, ... ve max_batch: batcher'ın en sık üreteceği boyutlar"""
+    sizes, n = [], 1
+    while n < max_batch:
+        sizes.append(n)
+        n *= 2
+    sizes.append(max_batch)
+    return sizes
+
+
+_warmup_env = os.getenv("CNN_WARMUP_BATCH_SIZES", "").strip()
+CNN_WARMUP_BATCH_SIZES = (
+    [int(v) for v in _warmup_env.split(",") if v.strip()] if _warmup_env
+    else _default_warmup_sizes(CNN_MAX_BATCH_SIZE)
+)
+
+# ── Decode/resize event loop dışında, sınırlı kapasiteli havuzda
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+INFERENCE_MAX_PENDING = int(os.getenv("INFERENCE_MAX_PENDING", "32"))
+INFERENCE_RETRY_AFTER_S = int(os.getenv("INFERENCE_RETRY_AFTER_S", "1"))
+
+inference_executor = InferenceExecutor(
+    max_workers=INFERENCE_WORKERS,
+    max_pending=INFERENCE_MAX_PENDING,
+    retry_after_s=INFERENCE_RETRY_AFTER_S,
+)
+
+
+# ── Tahmin cache'i: aynı görüntü tekrar yüklenirse forward pass atlanır
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "1024"))   # 0 → kapalı
+PREDICTION_CACHE_TTL_S = float(os.getenv("PREDICTION_CACHE_TTL_S", "3600"))
+PREDICTION_CACHE_PERCEPTUAL = os.getenv("PREDICTION_CACHE_PERCEPTUAL", "0") == "1"
+
+prediction_cache = PredictionCache(
+    max_entries=PREDICTION_CACHE_SIZE,
+    ttl_s=PREDICTION_CACHE_TTL_S,
+    perceptual=PREDICTION_CACHE_PERCEPTUAL,
+)
+
+
+def _perceptual_lookup(x: np.ndarray) -> tuple[Optional[str], Optional[tuple]]:
+    """İkinci seviye cache: (perceptual_key, hit) döndür."""
+    if not prediction_cache.perceptual:
+        return None, None
+    pkey = prediction_cache.perceptual_key(x)
+    return pkey, prediction_cache.get_perceptual(pkey)
+
+
+def run_cnn_prediction(image_bytes: bytes) -> tuple[str, float, list[float]]:
+    """Görüntü bytes'ı → (class_label, confidence, probs[])"""
+    key = prediction_cache.content_key(image_bytes) if image_bytes else None
+    hit = prediction_cache.get(key) if key else None
+    if hit is not None:
+        return hit
+
+    x = decode_image(image_bytes)  # (1, 256, 256, 3) float32
+    pkey, hit = _perceptual_lookup(x)
+    if hit is not None:
+        prediction_cache.put(key, hit)
+        return hit
+
+    prediction_cache.record_miss()
+    result = _postprocess(batcher.predict(x)[0])
+    prediction_cache.put(key, result, pkey)
+    return result
+
+
+async def run_cnn_prediction_async(image_bytes: bytes) -> tuple[str, float, list[float]]:
+    """run_cnn_prediction'ın async hali.
+
+    Decode executor'da, forward pass batcher'da çalışır; event loop bloklanmaz.
+    Cache hit'leri kuyruğa hiç girmez. Kuyruk doluysa InferenceBusyError,
+    CNN kapalıysa ModelUnavailableError fırlatır.
+    """
+    if not CNN_ENABLED:
+        raise ModelUnavailableError("CNN devre dışı (CNN_ENABLED=0)")
+
+    key = prediction_cache.content_key(image_bytes) if image_bytes else None
+    hit = prediction_cache.get(key) if key else None
+    if hit is not None:
+        return hit
+
+    async with inference_executor.slot():
+        x = await inference_executor.run(decode_image, image_bytes)
+        pkey, hit = _perceptual_lookup(x)
+        if hit is not None:
+            prediction_cache.put(key, hit)
+            return hit
+        prediction_cache.record_miss()
+        probs = await batcher.predict_async(x)
+
+    result = _postprocess(probs[0])
+    prediction_cache.put(key, result, pkey)
+    return result
+
+
+async def run_cnn_prediction_batch_async(images: list) -> list:
+    """Birden çok görüntü → her biri için (cls, conf, probs) ya da Exception.
+
+    Cache'te olmayanlar executor'da paralel decode edilir ve batcher'a tek bir
+    çok satırlı iş olarak girer (tek batched forward pass). Bozuk bir görüntü
+    sadece kendi sonucunu hataya çevirir.
+    """
+    if not CNN_ENABLED:
+        raise ModelUnavailableError("CNN devre dışı (CNN_ENABLED=0)")
+
+    results: list = [None] * len(images)
+    keys: list = [None] * len(images)
+    todo = []
+    for i, image_bytes in enumerate(images):
+        if not image_bytes:
+            results[i] = ValueError("Boş görüntü")
+            continue
+        keys[i] = prediction_cache.content_key(image_bytes)
+        hit = prediction_cache.get(keys[i])
+        if hit is not None:
+            results[i] = hit
+        else:
+            todo.append(i)
+
+    if not todo:
+        return results
+
+    async with inference_executor.slot(weight=len(todo)):
+        # Her görüntü ortak buffer'ın kendi satırına decode edilir
+        buf = np.empty((len(todo), IMG_SIZE[1], IMG_SIZE[0], 3), dtype=np.float32)
+        decoded = await asyncio.gather(
+            *(inference_executor.run(decode_image, images[i], buf[j:j + 1]) for j, i in enumerate(todo)),
+            return_exceptions=True,
+        )
+
+        rows, row_idx, pkeys = [], [], {}
+        for j, (i, d) in enumerate(zip(todo, decoded)):
+            if isinstance(d, BaseException):
+                results[i] = d
+                continue
+            pkey, hit = _perceptual_lookup(buf[j:j + 1])
+            if hit is not None:
+                prediction_cache.put(keys[i], hit)
+                results[i] = hit
+                continue
+            prediction_cache.record_miss()
+            rows.append(j)
+            row_idx.append(i)
+            pkeys[i] = pkey
+
+        if rows:
+            batch = buf if len(rows) == len(todo) else buf[rows]
+            probs = await batcher.predict_async(batch)
+
+    for r, i in enumerate(row_idx):
+        result = _postprocess(probs[r])
+        prediction_cache.put(keys[i], result, pkeys[i])
+        results[i] = result
+    return results
+
+
+def aggregate_predictions(results: list, *, top_k: int = 3) -> Optional[dict]:
+    """Bitki seviyesinde karar: başarılı tahminlerin ortalama olasılıkları + top-k"""
+    ok = [r for r in results if isinstance(r, tuple)]
+    if not ok:
+        return None
+
+    mean = np.mean(np.asarray([r[2] for r in ok], dtype=np.float32), axis=0)
+    order = np.argsort(mean)[::-1][:max(1, top_k)]
+    idx = int(order[0])
+    votes: dict = {}
+    for cls, _, _ in ok:
+        votes[cls] = votes.get(cls, 0) + 1
+
+    return {
+        "class": CLASSES[idx],
+        "confidence": float(mean[idx]),
+        "mean_probs": [float(p) for p in mean],
+        "top_k": [{"class": CLASSES[int(i)], "confidence": float(mean[int(i)])} for i in order],
+        "votes": votes,
+        "n_images": len(ok),
+    }
+
+
+def inference_stats() -> dict:
+    """Inference metrikleri (batch boyutu histogramı vb.)"""
+    return {
+        "model": {**model_status(), "model_path": str(MODEL_PATH)},
+        "batcher": batcher.stats(),
+        "executor": inference_executor.stats(),
+        "cache": prediction_cache.stats(),
+    }
+
+
+def shutdown_inference() -> None:
+    inference_executor.shutdown()
@@ -0,0 +1,80 @@
+# serialization.py
+# Merkezi JSON kodlama/çözme: orjson varsa onunla; çıktı önceki stdlib çıktısıyla byte byte aynı
+
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:  # opsiyonel bağımlılık: yoksa stdlib kullanılır
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson.JSONDecodeError bu sınıfın alt sınıfı: mevcut except blokları çalışmaya devam eder
+JSONDecodeError = json.JSONDecodeError
+
+# orjson float'ları bu aralıkta (ve 0.0'da) Python repr'i ile aynı yazar; dışında
+# biçim farklı (3.2e-05 → 0.000032, 1e+16 → 1e16). tests/test_serialization.py
+_FLOAT_PARITY_MIN = 1e-4
+_FLOAT_PARITY_MAX = 1e16
+_INT_MAX = 2 ** 63 - 1
+
+
+def _orjson_safe(obj: Any) -> bool:
+    """
+    Payload orjson ile stdlib'le aynı byte'lara mı kodlanır: yalnızca dict (str key),
+    list/tuple, str, int (64 bit), bool, None ve parite aralığındaki float'lar.
+    Diğer her şey (küçük olasılıklar, datetime, alt sınıflar...) stdlib yoluna gider.
+    """
+    t = type(obj)
+    if t is str or obj is None or t is bool:
+        return True
+    if t is int:
+        return -_INT_MAX <= obj <= _INT_MAX
+    if t is float:
+        a = abs(obj)
+        return a == 0.0 or _FLOAT_PARITY_MIN <= a < _FLOAT_PARITY_MAX
+    if t is dict:
+        for k, v in obj.items():
+            if type(k) is not str or not _orjson_safe(v):
+                return False
+        return True
+    if t is list or t is tuple:
+        for v in obj:
+            if not _orjson_safe(v):
+                return False
+        return True
+    return False
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """
+    HTTP gövdesi: Starlette JSONResponse ile aynı biçim (ensure_ascii=False,
+    ayraçlar ",", ":", NaN yasak). orjson yalnızca çıktı aynı olacaksa kullanılır.
+    """
+    if orjson is not None and _orjson_safe(obj):
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps(obj: Any) -> str:
+    """
+    WS text frame'i: önceki json.dumps(ensure_ascii=False) çıktısı (", " / ": "
+    ayraçlı). orjson boşluklu ayraç yazamadığından bu yol stdlib'de kalır.
+    """
+    return json.dumps(obj, ensure_ascii=False)
+
+
+if orjson is not None:
+    def loads(data) -> Any:
+        return orjson.loads(data)
+else:
+    loads = json.loads
+
+
+class ORJSONResponse(JSONResponse):
+    """Uygulamanın varsayılan response sınıfı (app.default_response_class)"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_bytes(content)
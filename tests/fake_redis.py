@@ -0,0 +1,83 @@
+# fake_redis.py
+# Testler için süreç içi Redis yerine geçen: RedisPubSub'ın kullandığı redis.asyncio alt kümesi
+# (publish, pubsub().subscribe/unsubscribe/get_message, aclose). Aynı FakeRedisServer'ı
+# paylaşan client'lar ayrı node'lar gibi birbirinin yayınlarını alır.
+
+import asyncio
+from typing import Dict, Optional, Set
+
+
+class FakeRedisServer:
+    """Kanal → abone FakePubSub kümesi"""
+
+    def __init__(self):
+        self.channels: Dict[str, Set["FakePubSub"]] = {}
+
+    def client(self) -> "FakeRedis":
+        return FakeRedis(self)
+
+
+class FakeRedis:
+    def __init__(self, server: Optional[FakeRedisServer] = None):
+        self.server = server or FakeRedisServer()
+        self.closed = False
+
+    def pubsub(self, ignore_subscribe_messages: bool = False) -> "FakePubSub":
+        return FakePubSub(self.server, ignore_subscribe_messages)
+
+    async def publish(self, channel: str, data) -> int:
+        """Redis gibi: mesajı alan abone sayısını döndürür, veri bytes olarak iletilir"""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        subs = list(self.server.channels.get(channel, ()))
+        for ps in subs:
+            ps._push({"type": "message", "pattern": None,
+                      "channel": channel.encode("utf-8"), "data": data})
+        return len(subs)
+
+    async def aclose(self) -> None:
+        self.closed = True
+
+
+class FakePubSub:
+    def __init__(self, server: FakeRedisServer, ignore_subscribe_messages: bool):
+        self._server = server
+        self._ignore = ignore_subscribe_messages
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self.channels: Set[str] = set()
+        self.closed = False
+
+    def _push(self, msg: dict) -> None:
+        self._queue.put_nowait(msg)
+
+    async def subscribe(self, *channels: str) -> None:
+        for ch in channels:
+            self.channels.add(ch)
+            self._server.channels.setdefault(ch, set()).add(self)
+            if not self._ignore:
+                self._push({"type": "subscribe", "pattern": None,
+                            "channel": ch.encode("utf-8"), "data": len(self.channels)})
+
+    async def unsubscribe(self, *channels: str) -> None:
+        for ch in channels:
+            self.channels.discard(ch)
+            subs = self._server.channels.get(ch)
+            if subs is not None:
+                subs.discard(self)
+                if not subs:
+                    del self._server.channels[ch]
+            if not self._ignore:
+                self._push({"type": "unsubscribe", "pattern": None,
+                            "channel": ch.encode("utf-8"), "data": len(self.channels)})
+
+    async def get_message(self, timeout: float = 0.0) -> Optional[dict]:
+        if not self.channels and self._queue.empty():
+            raise RuntimeError("pubsub connection not set: did you forget to call subscribe() or psubscribe()?")
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout=timeout or None)
+        except asyncio.TimeoutError:
+            return None
+
+    async def aclose(self) -> None:
+        await self.unsubscribe(*list(self.channels))
+        self.closed = True
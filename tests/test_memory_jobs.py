@@ -0,0 +1,44 @@
+import pytest
+
+# memory_jobs, groq_service (httpx) ve firestore_service (google-cloud-firestore) üzerinden yüklenir
+pytest.importorskip("httpx")
+pytest.importorskip("google.cloud.firestore")
+
+from services.chat import memory_jobs as mj  # noqa: E402
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    monkeypatch.setattr(mj, "MEMORY_ENABLED", True)
+    q = mj.MemoryJobQueue(refresh_every=3, max_tracked=4)
+    q.fired = []
+    monkeypatch.setattr(q, "schedule", lambda uid, thread_id: q.fired.append(len(q.msgs)))
+    q.msgs = []
+    return q
+
+
+def _note(q, n, thread_id="t1"):
+    q.msgs.extend([thread_id] * n)
+    q.note_messages("u", thread_id, n)
+
+
+def test_pair_writes_keep_the_every_n_cadence(queue):
+    # kullanıcı+asistan çiftleri: her 3'ün katı geçildiğinde bir özet (eski hali: 4, 8, 12)
+    for _ in range(6):
+        _note(queue, 2)
+    assert queue.fired == [4, 6, 10, 12]
+
+
+def test_mixed_single_and_pair_writes(queue):
+    for n in (1, 2, 1, 2, 2, 1, 1):
+        _note(queue, n)
+    # toplamlar 1, 3, 4, 6, 8, 9, 10 → özet tam 3, 6, 9'da
+    assert queue.fired == [3, 6, 9]
+    assert queue._counts[("u", "t1")] == 1
+
+
+def test_counters_are_lru_bounded(queue):
+    for i in range(10):
+        _note(queue, 1, thread_id=f"t{i}")
+    assert len(queue._counts) == 4
+    assert queue.stats()["evicted"] == 6
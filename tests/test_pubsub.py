@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+
+from fake_redis import FakeRedisServer
+from services.connection.pubsub import InProcessPubSub, PubSubBackend, RedisPubSub
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def _node(server: FakeRedisServer):
+    """Ortak sunucuya bağlı bir RedisPubSub + teslim edilenleri biriktiren handler"""
+    inbox = []
+
+    async def handler(thread_id, data):
+        inbox.append((thread_id, data))
+
+    ps = RedisPubSub(prefix="test:ws", client=server.client())
+    ps.set_handler(handler)
+    await ps.start()
+    return ps, inbox
+
+
+async def _settle():
+    # Okuyucu task'larının kuyruktaki mesajları işlemesi için döngüyü birkaç kez çevir
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def test_base_is_abstract():
+    with pytest.raises(TypeError):
+        PubSubBackend()
+
+
+def test_publish_reaches_other_node_not_self():
+    async def scenario():
+        server = FakeRedisServer()
+        a, inbox_a = await _node(server)
+        b, inbox_b = await _node(server)
+        try:
+            await a.subscribe("t1")
+            await b.subscribe("t1")
+            await a.publish("t1", '{"type": "delta"}')
+            await _settle()
+            return inbox_a, inbox_b, a.stats(), b.stats()
+        finally:
+            await a.stop()
+            await b.stop()
+
+    inbox_a, inbox_b, stats_a, stats_b = run(scenario())
+    assert inbox_b == [("t1", '{"type": "delta"}')]
+    assert inbox_a == []                       # kendi yayını tekrar teslim edilmez
+    assert stats_a["published"] == 1 and stats_b["received"] == 1
+
+
+def test_only_subscribed_threads_are_delivered():
+    async def scenario():
+        server = FakeRedisServer()
+        a, _ = await _node(server)
+        b, inbox_b = await _node(server)
+        try:
+            await b.subscribe("t1")
+            await a.publish("t2", "x")
+            await a.publish("t1", "y|z")       # payload içindeki "|" zarfı bozmaz
+            await _settle()
+            return inbox_b
+        finally:
+            await a.stop()
+            await b.stop()
+
+    assert run(scenario()) == [("t1", "y|z")]
+
+
+def test_unsubscribe_stops_delivery():
+    async def scenario():
+        server = FakeRedisServer()
+        a, _ = await _node(server)
+        b, inbox_b = await _node(server)
+        try:
+            await b.subscribe("t1")
+            await a.publish("t1", "first")
+            await _settle()
+            await b.unsubscribe("t1")
+            await a.publish("t1", "second")
+            await _settle()
+            return inbox_b, b.stats(), server.channels
+        finally:
+            await a.stop()
+            await b.stop()
+
+    inbox_b, stats_b, channels = run(scenario())
+    assert inbox_b == [("t1", "first")]
+    assert stats_b["channels"] == 0
+    assert channels == {}
+
+
+def test_stop_closes_pubsub_but_not_injected_client():
+    async def scenario():
+        server = FakeRedisServer()
+        client = server.client()
+        ps = RedisPubSub(prefix="test:ws", client=client)
+        await ps.start()
+        await ps.subscribe("t1")
+        await ps.stop()
+        return client, server.channels
+
+    client, channels = run(scenario())
+    assert channels == {}
+    assert client.closed is False              # dışarıdan verilen client'ı çağıran kapatır
+
+
+def test_in_process_publish_is_local_noop():
+    async def scenario():
+        ps = InProcessPubSub()
+        await ps.subscribe("t1")
+        await ps.publish("t1", "x")
+        return ps.stats()
+
+    stats = run(scenario())
+    assert stats["published"] == 1 and stats["channels"] == 1
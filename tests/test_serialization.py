@@ -0,0 +1,63 @@
+import json
+import random
+
+import pytest
+
+from services import serialization
+from services.serialization import dumps, dumps_bytes, loads
+
+
+def starlette_render(obj) -> bytes:
+    """Starlette JSONResponse.render ile aynı"""
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+PAYLOADS = [
+    {"class": "Tomato___Bacterial_spot", "classTr": "Domates bakteriyel leke", "confidence": 0.8731},
+    {"probs": [0.8731, 0.0612, 0.0004, 3.2e-05, 1e-07, 0.0], "latency_ms": 231},
+    {"content": "Teşhis: ğüşıöç İĞÜŞÖÇ \"tırnak\" \\ \n\t", "notes": ["Sulamayı azaltın."]},
+    {"big": 2 ** 70, "neg": -(2 ** 64), "huge": 1e16, "max": 1.7976931348623157e308},
+    {1: "int key", "nested": {"a": [True, False, None, -0.0, (1, 2)]}},
+    [],
+    "düz metin",
+]
+
+
+@pytest.mark.parametrize("payload", PAYLOADS)
+def test_http_body_matches_starlette(payload):
+    assert dumps_bytes(payload) == starlette_render(payload)
+
+
+@pytest.mark.parametrize("payload", PAYLOADS)
+def test_ws_text_matches_stdlib(payload):
+    assert dumps(payload) == json.dumps(payload, ensure_ascii=False)
+    assert loads(dumps(payload)) == json.loads(json.dumps(payload, ensure_ascii=False))
+
+
+def test_nan_still_rejected_in_http_body():
+    with pytest.raises(ValueError):
+        dumps_bytes({"x": float("nan")})
+
+
+def test_orjson_float_parity_range():
+    """_orjson_safe'in kabul ettiği float'larda orjson ve repr aynı yazar"""
+    orjson = pytest.importorskip("orjson")
+    rng = random.Random(0)
+    checked = 0
+    for _ in range(200_000):
+        x = rng.uniform(1, 10) * 10 ** rng.randint(-6, 17)
+        x = round(x, rng.randint(0, 17)) if rng.random() < 0.5 else x
+        x = -x if rng.random() < 0.5 else x
+        if not serialization._orjson_safe(x):
+            continue
+        assert orjson.dumps(x) == json.dumps(x).encode(), repr(x)
+        checked += 1
+    for x in (0.0, -0.0, 1e-4, 1.0, 100.0, 9999999999999998.0, 0.1 + 0.2):
+        assert serialization._orjson_safe(x)
+        assert orjson.dumps(x) == json.dumps(x).encode()
+    assert checked > 100_000
+
+
+def test_out_of_range_floats_use_stdlib():
+    for x in (3.2e-05, 1e-07, 1e16, 5e-324, float("inf")):
+        assert not serialization._orjson_safe({"p": [0.5, x]})